@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Reproducible throughput benchmarks for the resize/convert pipeline.
+#
+# A synthetic corpus of mixed sizes and formats is generated locally from a
+# fixed seed, then every case runs in its own Python process so that its peak
+# RSS is measured in isolation. Results are written as JSON and can be compared
+# against a previous run to spot regressions.
+
+# Usage:
+# python benchmarks/bench_pipeline.py --output results.json
+# python benchmarks/bench_pipeline.py --compare baseline.json --output new.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(SRC_DIR)
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from cli import CLI  # noqa: E402
+from file_iterator import FileIterator  # noqa: E402
+from image import ImageFormat  # noqa: E402
+from image_manipulator import ImageManipulator  # noqa: E402
+
+CORPUS_SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+CORPUS_FORMATS = [
+    ("JPEG", "jpg", "RGB"),
+    ("PNG", "png", "RGBA"),
+    ("WEBP", "webp", "RGB"),
+]
+CASES = ["walk", "resize", "convert", "save", "main"]
+MAX_SIZE = 800
+
+
+def generate_corpus(folder: str, count: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    total_bytes = 0
+    for i in range(count):
+        width, height = CORPUS_SIZES[i % len(CORPUS_SIZES)]
+        format, ext, mode = CORPUS_FORMATS[
+            (i // len(CORPUS_SIZES)) % len(CORPUS_FORMATS)
+        ]
+        image = Image.new(mode, (width, height), _random_color(rnd, mode))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rnd.randrange(width), rnd.randrange(height)
+            r = rnd.randrange(10, max(width, height) // 4)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=_random_color(rnd, mode))
+
+        path = os.path.join(folder, f"set{i % 4}", f"img{i:05d}.{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path, format=format)
+        total_bytes += os.path.getsize(path)
+    return {"images": count, "bytes": total_bytes, "seed": seed}
+
+
+def _random_color(rnd: random.Random, mode: str) -> tuple[int, ...]:
+    return tuple(rnd.randrange(256) for _ in mode)
+
+
+def _corpus_files(corpus: str) -> list[str]:
+    cli = CLI([corpus, tempfile.gettempdir(), "-M", str(MAX_SIZE), "-q"])
+    return sorted(FileIterator(cli).walk())
+
+
+def bench_walk(corpus: str, output: str) -> int:
+    return len(_corpus_files(corpus))
+
+
+def bench_resize(corpus: str, output: str) -> int:
+    files = _corpus_files(corpus)
+    for file in files:
+        # Operations are only planned until the image is used
+        ImageManipulator(file).resize(0, 0, MAX_SIZE).image.load()
+    return len(files)
+
+
+def bench_convert(corpus: str, output: str) -> int:
+    files = _corpus_files(corpus)
+    for file in files:
+        image = ImageManipulator(file).downscale_to_rgb().downscale_to_grayscale()
+        image.image.load()
+    return len(files)
+
+
+def bench_save(corpus: str, output: str) -> int:
+    files = _corpus_files(corpus)
+    for i, file in enumerate(files):
+        image = ImageManipulator(file).downscale_to_rgb()
+        image.image.load()
+        image.save(os.path.join(output, f"{i:05d}.webp"), format=ImageFormat.WEBP)
+    return len(files)
+
+
+def bench_main(corpus: str, output: str) -> int:
+    main_py = os.path.join(SRC_DIR, "main.py")
+    cmd = [sys.executable, main_py, corpus, output, "-M", str(MAX_SIZE), "-q"]
+    subprocess.run(cmd, check=True)
+    return len(_corpus_files(corpus))
+
+
+def run_case(case: str, corpus: str) -> dict:
+    # Runs inside a fresh process, see run_isolated()
+    output = tempfile.mkdtemp(prefix="rexize_bench_out_")
+    try:
+        bench = globals()[f"bench_{case}"]
+        start = time.perf_counter()
+        images = bench(corpus, output)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+    peak_rss_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {"images": images, "seconds": seconds, "peak_rss_mb": peak_rss_kb / 1024}
+
+
+def run_isolated(case: str, corpus: str, corpus_bytes: int, repeat: int) -> dict:
+    cmd = [sys.executable, __file__, "--case", case, "--corpus", corpus]
+    runs = [
+        json.loads(subprocess.run(cmd, check=True, capture_output=True).stdout)
+        for _ in range(repeat)
+    ]
+    best = min(runs, key=lambda run: run["seconds"])
+    return {
+        **best,
+        "images_per_sec": best["images"] / best["seconds"],
+        "mb_per_sec": corpus_bytes / (1024 * 1024) / best["seconds"],
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print(f"{'case':<10}{'baseline img/s':>16}{'current img/s':>16}{'change':>10}")
+    for case, result in results["results"].items():
+        base = baseline.get("results", {}).get(case)
+        if not base:
+            continue
+        change = result["images_per_sec"] / base["images_per_sec"] - 1
+        print(
+            f"{case:<10}{base['images_per_sec']:>16.2f}"
+            f"{result['images_per_sec']:>16.2f}{change:>+10.1%}"
+        )
+
+
+def parse_args(cli_args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the rexize pipeline.")
+    parser.add_argument("--images", type=int, default=36, help="Corpus size")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus random seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument(
+        "--cases", nargs="+", choices=CASES, default=CASES, help="Cases to run"
+    )
+    parser.add_argument(
+        "--output", type=str, help="Write the results to this JSON file"
+    )
+    parser.add_argument("--compare", type=str, help="Baseline JSON results to compare")
+    parser.add_argument("--case", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", type=str, help=argparse.SUPPRESS)
+    return parser.parse_args(cli_args)
+
+
+def main():
+    args = parse_args()
+    if args.case:
+        print(json.dumps(run_case(args.case, args.corpus)))
+        return
+
+    corpus = tempfile.mkdtemp(prefix="rexize_bench_corpus_")
+    try:
+        corpus_info = generate_corpus(corpus, args.images, args.seed)
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": corpus_info,
+            "results": {},
+        }
+        for case in args.cases:
+            result = run_isolated(case, corpus, corpus_info["bytes"], args.repeat)
+            results["results"][case] = result
+            print(
+                f"{case:<10}{result['images_per_sec']:>10.2f} img/s"
+                f"{result['mb_per_sec']:>10.2f} MB/s"
+                f"{result['peak_rss_mb']:>10.1f} MB RSS"
+            )
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
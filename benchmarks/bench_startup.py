@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Cold-start benchmark of the rexize CLI, for job scripts that run it for one
+# or two files at a time. Every sample is a fresh Python process; the median
+# wall time of each case is reported, and compared against a baseline or a
+# budget to catch start-up regressions.
+
+# Usage:
+# python benchmarks/bench_startup.py --output startup.json
+# python benchmarks/bench_startup.py --compare startup.json --max-ms 300
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+MAIN = os.path.join(SRC_DIR, "main.py")
+SOURCE_IMAGE = os.path.join(ROOT_DIR, "tests", "data", "test_img.png")
+
+CASES = ["python", "import", "help", "one_file"]
+
+
+def case_command(case: str, folder: str) -> list[str]:
+    if case == "python":
+        # The interpreter alone, as a floor for the other cases
+        return [sys.executable, "-c", "pass"]
+    if case == "import":
+        code = f"import sys; sys.path.insert(0, {SRC_DIR!r}); import main"
+        return [sys.executable, "-c", code]
+    if case == "help":
+        return [sys.executable, MAIN, "--help"]
+    # Outside of the input folder, so that outputs are not processed again
+    input_folder = os.path.join(folder, "in")
+    output = os.path.join(folder, "out")
+    # The default command line, with as many jobs as CPUs
+    return [sys.executable, MAIN, input_folder, output, "-W", "50%", "-q"]
+
+
+def run_case(case: str, folder: str, repeat: int) -> dict:
+    command = case_command(case, folder)
+    samples = []
+    for _ in range(repeat):
+        # Every sample writes the output from scratch
+        shutil.rmtree(os.path.join(folder, "out"), ignore_errors=True)
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print(f"\n{'case':<10}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for case, result in results["results"].items():
+        base = baseline.get("results", {}).get(case)
+        if not base:
+            continue
+        change = result["median_ms"] / base["median_ms"] - 1
+        print(
+            f"{case:<10}{base['median_ms']:>14.1f}"
+            f"{result['median_ms']:>14.1f}{change:>+10.1%}"
+        )
+
+
+def parse_args(cli_args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the rexize start-up.")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per case")
+    parser.add_argument(
+        "--cases", nargs="+", choices=CASES, default=CASES, help="Cases to run"
+    )
+    parser.add_argument(
+        "--output", type=str, help="Write the results to this JSON file"
+    )
+    parser.add_argument("--compare", type=str, help="Baseline JSON results to compare")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Exit with status 1 when the median of the one_file case is slower",
+    )
+    return parser.parse_args(cli_args)
+
+
+def main():
+    args = parse_args()
+    folder = tempfile.mkdtemp(prefix="rexize_bench_startup_")
+    try:
+        os.makedirs(os.path.join(folder, "in"))
+        shutil.copy(SOURCE_IMAGE, os.path.join(folder, "in"))
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": {},
+        }
+        for case in args.cases:
+            result = run_case(case, folder, args.repeat)
+            results["results"][case] = result
+            print(f"{case:<10}{result['median_ms']:>10.1f} ms")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    one_file = results["results"].get("one_file")
+    if args.max_ms and one_file and one_file["median_ms"] > args.max_ms:
+        print(f"one_file start-up over budget: {one_file['median_ms']:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
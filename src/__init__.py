@@ -1,5 +1,30 @@
 # flake8: noqa
-# from cli import CLI
-# from file_iterator import FileIterator
-# from image_manipulator import ImageFormat, ImageManipulator, ImageSizeUnit
-# from main import main
+import importlib
+import os
+import sys
+
+# Modules import each other as top-level modules, as when run from main.py
+sys.path.append(os.path.dirname(__file__))
+
+# Public names and their modules, imported on first use so that importing the
+# package stays cheap
+_EXPORTS = {
+    "CLI": "cli",
+    "FileIterator": "file_iterator",
+    "ImageFormat": "image",
+    "ImageSizeUnit": "image",
+    "OutputSpec": "image",
+    "ImageManipulator": "image_manipulator",
+    "Pipeline": "pipeline",
+    "TilePyramid": "tiler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,100 @@
+# Animated GIF and WEBP images: the frames are decoded and transformed one at a
+# time, so that only the current source frame is held at full size. Pillow's GIF
+# and WEBP encoders still keep every transformed frame until the animation is
+# written, so memory grows with the frame count at the output size. Every frame
+# gets the same planned operations, and the animation keeps the frame durations
+# and loop count of the source.
+
+# Usage:
+# frames = AnimatedFrames(image, [("resize", ((100, 80), 0))])
+# frames.save("banner.webp", format="WEBP", quality=80)
+
+from typing import IO, Generator
+
+from image import ImageFormat, ResampleFilter
+from lazy import lazy_import
+from planner import Operation, plan_operations
+
+Image = lazy_import("PIL.Image")
+
+ANIMATED_FORMATS = [ImageFormat.GIF, ImageFormat.WEBP]
+
+
+def is_animated(image: "Image.Image") -> bool:
+    return getattr(image, "is_animated", False)
+
+
+class AnimatedFrames:
+    def __init__(self, image: "Image.Image", operations: list[Operation]) -> None:
+        # image is the opened source, seeked frame by frame while saving
+        self._image = image
+        # Frames are resampled in a full colour mode, as Pillow only resizes
+        # palette images with the nearest neighbour
+        self._mode = "RGBA" if self._has_alpha(image) else "RGB"
+        self._plan = plan_operations(operations, image.size, self._mode)
+        self._durations: list[int] = []
+
+    @property
+    def n_frames(self) -> int:
+        return self._image.n_frames
+
+    @property
+    def durations(self) -> list[int]:
+        return self._durations
+
+    def save(self, fp: str | IO[bytes], format: str | None = None, **kwargs) -> None:
+        # Same signature as Image.save(), so that encoder.fit_to_size() can also
+        # search the quality of an animation
+        self._durations = []
+        frames = self._frames()
+        first = next(frames)
+        if "loop" in self._image.info:
+            kwargs.setdefault("loop", self._image.info["loop"])
+        # The encoders read the duration of each frame after pulling it from
+        # the generator, which appends it to the list first
+        first.save(
+            fp,
+            format=format,
+            save_all=True,
+            append_images=frames,
+            duration=self._durations,
+            **kwargs,
+        )
+
+    def _frames(self) -> Generator["Image.Image", None, None]:
+        try:
+            for index in range(self.n_frames):
+                self._image.seek(index)
+                # convert() copies the frame out of the decoder, which reuses
+                # its buffer for the next frame
+                frame = self._image.convert(self._mode)
+                for name, args in self._plan:
+                    frame = getattr(self, f"_{name}")(frame, *args)
+                self._durations.append(self._image.info.get("duration", 0))
+                yield frame
+        finally:
+            self._image.seek(0)
+
+    @staticmethod
+    def _resize(
+        frame: "Image.Image",
+        size: tuple[int, int],
+        draft: float = 0,
+        filter: ResampleFilter | None = None,
+        reducing_gap: float | None = None,
+    ) -> "Image.Image":
+        # Frames cannot be drafted: reducing_gap gives the same speed up
+        resample = Image.Resampling[filter.value] if filter else None
+        return frame.resize(size, resample, reducing_gap=reducing_gap or draft or None)
+
+    @staticmethod
+    def _convert(frame: "Image.Image", mode: str) -> "Image.Image":
+        return frame if frame.mode == mode else frame.convert(mode)
+
+    @staticmethod
+    def _rotate(frame: "Image.Image", angle: int) -> "Image.Image":
+        return frame.rotate(angle)
+
+    @staticmethod
+    def _has_alpha(image: "Image.Image") -> bool:
+        return "A" in image.mode or "transparency" in image.info
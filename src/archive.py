@@ -0,0 +1,149 @@
+# Zip and tar archives as the input or output of a run. Members are read in
+# archive order and written as a single sequential stream, without extracting
+# anything to disk: bulk sequential I/O rather than one small file, and its
+# metadata, per image. Tar archives are read and written as pure streams, so
+# they can also be compressed (.tar.gz, .tar.bz2, .tar.xz).
+
+# Usage:
+# reader = ArchiveReader("photos.tar.gz")
+# writer = ArchiveWriter("thumbnails.zip")
+# for name in reader:
+#     writer.add(f"thumbs/{name}", resize(reader.read(name)))
+# writer.close()
+# reader.close()
+
+import os
+import posixpath
+import tarfile
+import time
+import uuid
+import zipfile
+from io import BytesIO
+from typing import Callable, Generator
+
+TAR_EXTENSIONS = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tbz2": "bz2",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+}
+ZIP_EXTENSIONS = [".zip"]
+
+
+def archive_type(path: str) -> str | None:
+    # "zip", "tar" or None, from the file name
+    name = path.lower()
+    if any(name.endswith(ext) for ext in ZIP_EXTENSIONS):
+        return "zip"
+    if any(name.endswith(ext) for ext in TAR_EXTENSIONS):
+        return "tar"
+    return None
+
+
+def _compression(path: str) -> str:
+    name = path.lower()
+    return next(
+        (mode for ext, mode in TAR_EXTENSIONS.items() if name.endswith(ext)), ""
+    )
+
+
+class ArchiveReader:
+    def __init__(self, path: str, filter: Callable[[str], bool] | None = None) -> None:
+        # filter selects the members to read, by name
+        self._path = path
+        self._filter = filter or (lambda name: True)
+        self._type = archive_type(path)
+        if self._type == "zip":
+            self._archive = zipfile.ZipFile(path)
+        elif self._type == "tar":
+            # Stream mode never seeks back, as for a pipe
+            self._archive = tarfile.open(path, f"r|{_compression(path) or '*'}")
+        else:
+            raise ValueError(f"Unsupported archive: {path}")
+        # Zip members by name, and tar members read while iterating, kept until
+        # read()
+        self._members: dict[str, zipfile.ZipInfo] = {}
+        self._buffered: dict[str, bytes] = {}
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __iter__(self) -> Generator[str, None, None]:
+        # Yield the normalised names of the members, in the order they are
+        # stored. Members outside of the archive root, such as ../x, are skipped.
+        if self._type == "zip":
+            infos = sorted(self._archive.infolist(), key=lambda i: i.header_offset)
+            for info in infos:
+                name = self._name(info.filename)
+                if name and not info.is_dir():
+                    self._members[name] = info
+                    yield name
+            return
+
+        for member in self._archive:
+            name = self._name(member.name)
+            if name and member.isfile():
+                self._buffered[name] = self._archive.extractfile(member).read()
+                yield name
+
+    def read(self, name: str) -> bytes:
+        if self._type == "zip":
+            return self._archive.read(self._members.pop(name))
+        return self._buffered.pop(name)
+
+    def _name(self, name: str) -> str | None:
+        name = posixpath.normpath(name)
+        if name.startswith(("/", "../")) or name == ".." or not self._filter(name):
+            return None
+        return name
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+class ArchiveWriter:
+    def __init__(self, path: str) -> None:
+        # The archive is written to a temporary file, renamed into place on
+        # close(), so that readers never see a partly written archive
+        self._path = path
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self._type = archive_type(path)
+        if self._type == "zip":
+            # Images are already compressed: store them as they are
+            self._archive = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_STORED)
+        elif self._type == "tar":
+            self._archive = tarfile.open(self._tmp_path, f"w|{_compression(path)}")
+        else:
+            raise ValueError(f"Unsupported archive: {path}")
+        self.members = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def add(self, name: str, data: bytes) -> None:
+        # Not thread-safe: members are appended one after the other
+        if self._type == "zip":
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, BytesIO(data))
+        self.members += 1
+
+    def close(self, commit: bool = True) -> None:
+        # Without commit, e.g. for an interrupted run, the archive is discarded
+        # and any previous archive at path is left as it was
+        try:
+            self._archive.close()
+            if commit:
+                os.replace(self._tmp_path, self._path)
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
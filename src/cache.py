@@ -0,0 +1,117 @@
+# Content-addressed on-disk cache of encoded images, keyed by a hash of the
+# source bytes plus the normalised processing parameters. Entries are evicted
+# least recently used first once the cache grows over its size cap; the file
+# modification time is the LRU clock, so several processes can share a cache.
+
+# Usage:
+# cache = ResultCache("/var/cache/rexize", max_bytes=1024**3)
+# key = cache.key(source_digest, params)
+# if not cache.get(key, out_file):
+#     ...
+#     cache.put(key, out_file)
+
+import hashlib
+import os
+import uuid
+from typing import Any, ClassVar
+
+from file_utils import link_or_copy
+from manifest import params_fingerprint
+
+EVICT_TO_RATIO = 0.9
+
+
+class ResultCache:
+    _shared: ClassVar[dict[tuple[str, int], "ResultCache"]] = {}
+
+    def __init__(self, directory: str, max_bytes: int, link: bool = True) -> None:
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._link = link
+        self._size: int | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def shared(cls, directory: str, max_bytes: int) -> "ResultCache":
+        # One instance per process and directory, so that worker processes do
+        # not rescan the cache for every file
+        key = (os.path.abspath(directory), max_bytes)
+        if key not in cls._shared:
+            cls._shared[key] = cls(directory, max_bytes)
+        return cls._shared[key]
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @staticmethod
+    def key(source_digest: str, params: dict[str, Any]) -> str:
+        data = f"{source_digest}:{params_fingerprint(params)}"
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self._directory, key[:2], key)
+
+    def get(self, key: str, dest: str | None = None) -> bytes | str | None:
+        # On a hit, link or copy the entry to dest and return its path, or
+        # return its content when no dest is given
+        path = self.path(key)
+        try:
+            os.utime(path)
+            if dest is None:
+                with open(path, "rb") as f:
+                    return f.read()
+            return link_or_copy(path, dest, link=self._link)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes | str) -> None:
+        # data is the encoded image, or the path of a file holding it
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        if isinstance(data, str):
+            link_or_copy(data, tmp_path, link=self._link)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += size
+        if self._size > self._max_bytes:
+            self.evict()
+
+    def evict(self, target_bytes: int | None = None) -> None:
+        if target_bytes is None:
+            target_bytes = int(self._max_bytes * EVICT_TO_RATIO)
+        entries, size = self._scan()
+        entries.sort()
+        for _, entry_size, path in entries:
+            if size <= target_bytes:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except FileNotFoundError:
+                pass
+        self._size = size
+
+    def _scan(self) -> tuple[list[tuple[float, int, str]], int]:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self._directory):
+            for file in files:
+                if file.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
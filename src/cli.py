@@ -1,12 +1,25 @@
 import argparse
+import copy
+import json
 import os
 import sys
 
-from image import ImageFormat, ImageSizeUnit
+from archive import archive_type
+from encoder import SUBSAMPLING, EncoderOptions
+from image import (
+    QUALITY_PROFILES,
+    ImageFormat,
+    ImageSizeUnit,
+    OutputSpec,
+    ResampleFilter,
+)
+from sharding import Shard
 
 
 class CLI:
     DEFAULT_CLI_ARGS = ["/tmp", "/tmp"]
+    STREAM = "-"
+    _default_args: argparse.Namespace | None = None
 
     def __init__(self, cli_args=None, debug_mode: bool = False) -> None:
         self._args = None
@@ -23,12 +36,29 @@ class CLI:
     @property
     def args(self) -> argparse.Namespace:
         if not self._args:
-            self._args = self._argparser(self.DEFAULT_CLI_ARGS)
+            # Defaults of every option, for a CLI that was never parsed. The
+            # parser is only built once per process for them.
+            if CLI._default_args is None:
+                CLI._default_args = self._argparser(self.DEFAULT_CLI_ARGS)
+            self._args = copy.deepcopy(CLI._default_args)
         return self._args
 
+    @property
+    def streaming(self) -> bool:
+        # Read one image from stdin and write the result to stdout
+        return self.args.input_folder == self.STREAM
+
+    @property
+    def archive_input(self) -> bool:
+        return archive_type(self.args.input_folder) is not None
+
+    @property
+    def archive_output(self) -> bool:
+        return archive_type(self.args.output_folder or "") is not None
+
     def print(self, *args, **kwargs):
         if not self.args.quiet:
-            print(*args, **kwargs)
+            print(*args, file=self._stdout, **kwargs)
 
     def error(self, *args, **kwargs):
         print(*args, file=sys.stderr, **kwargs)
@@ -40,11 +70,11 @@ class CLI:
 
     def verbose(self, *args, **kwargs):
         if self.args.verbose:
-            print(*args, **kwargs)
+            print(*args, file=self._stdout, **kwargs)
 
     def debug(self, *args, **kwargs):
         if self._dev_mode:
-            print(*args, **kwargs)
+            print(*args, file=self._stdout, **kwargs)
 
     def exit(self, status: int = 0):
         sys.exit(status)
@@ -54,9 +84,14 @@ class CLI:
             raise ValueError("Input folder is required")
         if not self.args.width and not self.args.height and not self.args.max_size:
             raise ValueError("At least one of width, height or max-size is required")
+        self._validate_numeric_args()
+        if self.streaming:
+            return self._validate_stream_args()
+        self._validate_mode_args()
 
-        # Validate the input folder exists and readable
-        if not os.path.isdir(self.args.input_folder) or not os.access(
+        # Validate the input folder, or archive, exists and readable
+        is_input = os.path.isfile if self.archive_input else os.path.isdir
+        if not is_input(self.args.input_folder) or not os.access(
             self.args.input_folder, os.R_OK
         ):
             raise FileNotFoundError(
@@ -67,16 +102,118 @@ class CLI:
         if not self.args.output_folder:
             self.args.output_folder = f"{self.args.input_folder}_resized"
 
-        # Create the output folder if not exists and check if writable
-        if not os.path.exists(self.args.output_folder):
-            os.makedirs(self.args.output_folder)
-        if not os.access(self.args.output_folder, os.W_OK):
-            raise PermissionError(
-                f"Output folder not writable at {self.args.output_folder}"
+        # Create the output folder, or the folder of the output archive, if not
+        # exists and check if writable
+        output_folder = self.args.output_folder
+        if self.archive_output:
+            output_folder = os.path.dirname(os.path.abspath(output_folder))
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        if not os.access(output_folder, os.W_OK):
+            raise PermissionError(f"Output folder not writable at {output_folder}")
+
+        return self
+
+    def _validate_numeric_args(self):
+        if self.args.draft and self.args.draft < 1:
+            raise ValueError("Draft reducing gap must be at least 1.0")
+        if self.args.jobs < 1:
+            raise ValueError("Number of jobs must be at least 1")
+        if self.args.io_threads < 0:
+            raise ValueError("Number of I/O threads must not be negative")
+        if min(self.args.read_ahead, self.args.write_behind) < 1:
+            raise ValueError("Read ahead and write behind must be at least 1")
+        if self.args.reducing_gap is not None and self.args.reducing_gap < 1:
+            raise ValueError("Reducing gap must be at least 1.0")
+        EncoderOptions.from_args(self.args)
+        if self.args.memory_limit < 0:
+            raise ValueError("Memory limit must not be negative")
+
+    def _validate_mode_args(self):
+        if self.args.npy:
+            self._validate_npy_args()
+        if self.args.tiles:
+            self._validate_tile_args()
+        if self.args.watch or self.args.mirror_deletes:
+            self._validate_watch_args()
+        if self.archive_input or self.archive_output:
+            self._validate_archive_args()
+
+    def _validate_npy_args(self):
+        # Every row of a shard has the same shape, so the size must be exact
+        args = self.args
+        if (
+            not args.width.value
+            or not args.height.value
+            or args.width.is_percentage
+            or args.height.is_percentage
+            or args.max_size.value
+        ):
+            raise ValueError("NumPy export requires a fixed width and height in pixels")
+        if any(
+            [
+                args.output,
+                args.preset,
+                args.incremental,
+                args.resume,
+                args.io_threads,
+                args.shard,
+            ]
+        ):
+            raise ValueError(
+                "NumPy export does not support extra outputs, incremental, resume, "
+                "I/O threads or shards"
+            )
+
+    def _validate_tile_args(self):
+        args = self.args
+        if args.tiles < 1 or args.tile_overlap < 0:
+            raise ValueError("Tile size must be positive and overlap not negative")
+        if any([args.output, args.preset, args.npy, args.io_threads]):
+            raise ValueError(
+                "Tiles do not support extra outputs, NumPy export or I/O threads"
+            )
+
+    def _validate_watch_args(self):
+        args = self.args
+        if not args.watch:
+            raise ValueError("Mirroring deletes requires --watch")
+        if args.watch_debounce < 0 or args.watch_poll < 0:
+            raise ValueError("Watch debounce and poll interval must not be negative")
+        if args.npy:
+            raise ValueError("NumPy export is not supported with --watch")
+
+    def _validate_archive_args(self):
+        # Archive members are streamed: they have no file to stat, link or watch,
+        # and an output archive is written again from scratch by every run
+        args = self.args
+        if any([args.incremental, args.passthrough, args.npy, args.tiles, args.watch]):
+            raise ValueError(
+                "Archives do not support incremental, passthrough, NumPy export, "
+                "tiles or watch"
+            )
+        if (args.resume or args.shard) and self.archive_output:
+            # Every shard would replace the archive of the others
+            raise ValueError(
+                "Resuming and shards are not supported with an output archive"
             )
 
+    def _validate_stream_args(self):
+        if self.args.output_folder != self.STREAM:
+            raise ValueError("Output must be - (stdout) when reading from stdin")
+        if len(self.args.outputs) != 1:
+            raise ValueError("Only a single output is supported when streaming")
+        if self.args.npy or self.args.tiles or self.args.shard or self.args.watch:
+            raise ValueError(
+                "NumPy export, tiles, shards and watch are not supported when streaming"
+            )
         return self
 
+    @property
+    def _stdout(self):
+        # Keep stdout clean for the image data when streaming
+        return sys.stderr if self._args and self.streaming else sys.stdout
+
     @staticmethod
     def _argparser(cli_args=None) -> argparse.Namespace:
         parser = argparse.ArgumentParser(
@@ -86,13 +223,15 @@ class CLI:
             "input_folder",
             type=str,
             default="/tmp",
-            help="Input folder containing images",
+            help="Input folder containing images, a zip or tar archive of images, or - "
+            "to read one image from stdin",
         )
         parser.add_argument(
             "output_folder",
             type=str,
             default="/tmp",
-            help="Output folder for resized images",
+            help="Output folder for resized images, a zip or tar archive to write them "
+            "into, or - to write to stdout",
         )
         parser.add_argument(
             "-W",
@@ -119,8 +258,75 @@ class CLI:
             "-f",
             "--format",
             type=str,
-            default="WEBP",
-            help="Format of the output image: JPEG, PNG, WEBP, GIF, TIFF, BMP",
+            help="Format of the output image: JPEG, PNG, WEBP, GIF, TIFF, BMP. "
+            "Defaults to WEBP",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            action="append",
+            default=[],
+            metavar="SPEC",
+            help="Extra output rendition, e.g. name=thumb,max=200,format=JPEG. "
+            "Can be repeated; each rendition is written to its own sub-folder, "
+            "and -W/-H/-M/-f, if given, still write to the output folder",
+        )
+        parser.add_argument(
+            "--preset",
+            type=str,
+            help="JSON file with a list of output renditions, as for --output",
+        )
+        parser.add_argument(
+            "--passthrough",
+            choices=["copy", "link", "skip"],
+            help="Copy, hardlink or skip images already at the output size, format "
+            "and mode instead of decoding and re-encoding them",
+        )
+        parser.add_argument(
+            "-Q",
+            "--quality",
+            type=int,
+            help="Encoder quality from 1 to 100, for JPEG and WEBP",
+        )
+        parser.add_argument(
+            "--webp-method",
+            type=int,
+            choices=range(7),
+            metavar="{0-6}",
+            help="WEBP encoder effort, 0 is the fastest and 6 the smallest "
+            "(default: 4)",
+        )
+        parser.add_argument(
+            "--lossless", action="store_true", help="Lossless WEBP encoding"
+        )
+        parser.add_argument(
+            "--progressive", action="store_true", help="Progressive JPEG encoding"
+        )
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="Extra encoder pass for smaller JPEG and PNG files",
+        )
+        parser.add_argument(
+            "--subsampling",
+            choices=SUBSAMPLING,
+            help="JPEG chroma subsampling",
+        )
+        parser.add_argument(
+            "--compress-level",
+            type=int,
+            choices=range(10),
+            metavar="{0-9}",
+            help="PNG compression level, 0 is the fastest and 9 the smallest "
+            "(default: 6)",
+        )
+        parser.add_argument(
+            "--target-bytes",
+            type=int,
+            default=0,
+            metavar="BYTES",
+            help="Highest JPEG or WEBP quality that fits in this size, found by a "
+            "binary search of several encodes",
         )
         parser.add_argument(
             "--rgb", action="store_true", help="Downscale RGBA images to RGB"
@@ -128,6 +334,212 @@ class CLI:
         parser.add_argument(
             "--grayscale", action="store_true", help="Downscale images to Grayscale"
         )
+        parser.add_argument(
+            "--draft",
+            type=float,
+            nargs="?",
+            const=2.0,
+            default=0,
+            metavar="GAP",
+            help="Fast decode at a reduced scale, at least GAP times the target size "
+            "(default: 2.0). Lower is faster, higher is better quality",
+        )
+        parser.add_argument(
+            "--quality-profile",
+            choices=list(QUALITY_PROFILES),
+            help="Speed and quality tradeoff of resizing: fast (bilinear), balanced "
+            "(bicubic) or best (Lanczos). Defaults to bicubic at full quality",
+        )
+        parser.add_argument(
+            "--filter",
+            type=str.upper,
+            choices=[resample.value for resample in ResampleFilter],
+            help="Resampling filter, overrides the quality profile",
+        )
+        parser.add_argument(
+            "--reducing-gap",
+            type=float,
+            metavar="GAP",
+            help="Shrink by an integer factor first, down to GAP times the target size,"
+            " then resample. Lower is faster, overrides the quality profile",
+        )
+        parser.add_argument(
+            "--npy",
+            type=int,
+            nargs="?",
+            const=1024,
+            default=0,
+            metavar="ROWS",
+            help="Write images into .npy shards of ROWS images (default: 1024) with "
+            "an index.json, instead of image files. Requires a fixed width and height",
+        )
+        parser.add_argument(
+            "--tiles",
+            type=int,
+            nargs="?",
+            const=254,
+            default=0,
+            metavar="SIZE",
+            help="Write a Deep Zoom (DZI) pyramid of SIZE pixel tiles (default: 254) "
+            "for every image, instead of a single image file",
+        )
+        parser.add_argument(
+            "--tile-overlap",
+            type=int,
+            default=1,
+            metavar="N",
+            help="Pixels of overlap between neighbouring tiles with --tiles",
+        )
+        parser.add_argument(
+            "--skip-uniform-tiles",
+            action="store_true",
+            help="Do not write tiles of a single colour or fully transparent",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of images to process in parallel. Defaults to the CPU count",
+        )
+        parser.add_argument(
+            "--io-threads",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Overlap I/O with processing: N threads read source files ahead "
+            "and N threads write outputs behind the workers",
+        )
+        parser.add_argument(
+            "--read-ahead",
+            type=int,
+            default=16,
+            metavar="N",
+            help="Maximum number of files read ahead of the workers with --io-threads",
+        )
+        parser.add_argument(
+            "--write-behind",
+            type=int,
+            default=16,
+            metavar="N",
+            help="Maximum number of processed files waiting to be written with "
+            "--io-threads",
+        )
+        parser.add_argument(
+            "--include",
+            action="append",
+            default=[],
+            metavar="PATTERN",
+            help="Only process files matching this glob pattern. Can be repeated",
+        )
+        parser.add_argument(
+            "--exclude",
+            action="append",
+            default=[],
+            metavar="PATTERN",
+            help="Skip files and folders matching this glob pattern. Can be repeated",
+        )
+        parser.add_argument(
+            "--max-depth",
+            type=int,
+            default=None,
+            help="Maximum depth of sub-folders to scan, 0 for the input folder only",
+        )
+        parser.add_argument(
+            "--scan-workers",
+            type=int,
+            default=4,
+            help="Number of threads scanning folders concurrently",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Skip files unchanged since the last run, tracked in a manifest",
+        )
+        parser.add_argument(
+            "--hash",
+            action="store_true",
+            help="Use content hashes to detect unchanged files in incremental mode",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the files completed by an interrupted run with the same "
+            "options, as recorded in the output folder's journal",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running after processing the input folder, and process new "
+            "or modified images as they land",
+        )
+        parser.add_argument(
+            "--watch-debounce",
+            type=float,
+            default=0.25,
+            metavar="SECONDS",
+            help="Wait until a file had no changes for SECONDS before processing "
+            "it with --watch",
+        )
+        parser.add_argument(
+            "--watch-poll",
+            type=float,
+            default=0,
+            metavar="SECONDS",
+            help="Poll the input folder every SECONDS with --watch, rather than "
+            "using inotify. Defaults to inotify where available",
+        )
+        parser.add_argument(
+            "--mirror-deletes",
+            action="store_true",
+            help="Delete the outputs of images deleted from the input folder with "
+            "--watch",
+        )
+        parser.add_argument(
+            "--shard",
+            type=str,
+            metavar="INDEX/COUNT",
+            help="Only process the files of shard INDEX (from 1) out of COUNT, to "
+            "split a run across machines. Merge their results with rexize merge",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            type=str,
+            help="Folder of a cache of processed images, shared across runs",
+        )
+        parser.add_argument(
+            "--cache-size",
+            type=int,
+            default=1024,
+            metavar="MB",
+            help="Maximum size of the cache in MB, least recently used images are "
+            "evicted first",
+        )
+        parser.add_argument(
+            "--memory-limit",
+            type=int,
+            default=0,
+            metavar="MB",
+            help="Approximate memory for decoded images in MB. Parallel jobs wait "
+            "until their images fit, and intermediate images are freed early. "
+            "Defaults to unlimited",
+        )
+        parser.add_argument(
+            "--stats",
+            type=str,
+            nargs="?",
+            const="-",
+            metavar="FILE",
+            help="Report per-stage timings at the end of the run, "
+            "as JSON if a FILE is given",
+        )
+        parser.add_argument(
+            "--stats-slowest",
+            type=int,
+            default=10,
+            metavar="N",
+            help="Number of slowest files to include in the stats report",
+        )
         parser.add_argument(
             "-q",
             "--quiet",
@@ -147,9 +559,52 @@ class CLI:
         args.max_size = ImageSizeUnit(args.max_size)
 
         # Validate the format is a valid image format
+        format_given = args.format is not None
         try:
-            args.format = ImageFormat[args.format.upper()]
+            args.format = ImageFormat[(args.format or "WEBP").upper()]
         except KeyError:
             raise ValueError("Invalid image format")
 
+        args.shard = Shard.parse(args.shard) if args.shard else None
+        args.outputs = CLI._build_outputs(args, format_given)
+        args.filter, args.reducing_gap = CLI._resample_args(args)
+        if args.npy and not args.grayscale:
+            # Shards hold RGB or grayscale rows
+            args.rgb = True
+
         return args
+
+    @staticmethod
+    def _resample_args(
+        args: argparse.Namespace,
+    ) -> tuple[ResampleFilter | None, float | None]:
+        # Explicit --filter and --reducing-gap override the quality profile
+        filter, reducing_gap = QUALITY_PROFILES.get(args.quality_profile, (None, None))
+        if args.filter:
+            filter = ResampleFilter[args.filter]
+        if args.reducing_gap is not None:
+            reducing_gap = args.reducing_gap
+        return filter, reducing_gap
+
+    @staticmethod
+    def _build_outputs(
+        args: argparse.Namespace, format_given: bool = False
+    ) -> list[OutputSpec]:
+        outputs = [OutputSpec.parse(spec) for spec in args.output]
+        if args.preset:
+            with open(args.preset) as f:
+                outputs += [OutputSpec.from_dict(spec) for spec in json.load(f)]
+
+        # Main output, straight into the output folder
+        main = OutputSpec("", args.width, args.height, args.max_size, args.format)
+        if not outputs:
+            return [main]
+
+        names = [output.name for output in outputs]
+        if "" in names or len(set(names)) != len(names):
+            raise ValueError("Each output rendition requires a unique name")
+        if any(size.value for size in [args.width, args.height, args.max_size]):
+            return [main, *outputs]
+        if format_given:
+            raise ValueError("--format with extra outputs requires -W, -H or -M")
+        return outputs
@@ -0,0 +1,116 @@
+# Dataset export: resized images are written as rows of fixed-size uint8
+# tensors into .npy shards, which training loaders can memory-map without
+# decoding any image. An index maps every row back to its source file.
+# numpy is an optional dependency, only imported when exporting.
+
+# Usage:
+# writer = ShardWriter("/data/train", width=224, height=224, mode="RGB")
+# writer.add(rendition.image.tobytes(), "cats/cat1.jpg")
+# writer.close()
+#
+# index = json.load(open("/data/train/index.json"))
+# shard = numpy.load("/data/train/" + index["shards"][0], mmap_mode="r")
+
+import json
+import os
+from typing import Any
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+SHARD_FILE = "shard-{:05d}.npy"
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Dataset export requires numpy: pip install rexize[dataset]")
+    return numpy
+
+
+class ShardWriter:
+    def __init__(
+        self,
+        folder: str,
+        width: int,
+        height: int,
+        mode: str = "RGB",
+        shard_size: int = 1024,
+    ) -> None:
+        self._numpy = _numpy()
+        self._folder = folder
+        # Rows are (height, width, channels), as Image.tobytes() lays them out
+        self._shape = (height, width, Image.getmodebands(mode))
+        self._mode = mode
+        self._shard_size = shard_size
+        self._shards: list[str] = []
+        self._paths: list[str] = []
+        self._shard = None
+        os.makedirs(folder, exist_ok=True)
+
+    @property
+    def rows(self) -> int:
+        return len(self._paths)
+
+    def add(self, pixels: bytes, path: str) -> str:
+        # Append one image of the writer's size and mode, and return the shard
+        # and row it was written to
+        row = self.rows % self._shard_size
+        if row == 0:
+            self._next_shard()
+        array = self._numpy.frombuffer(pixels, dtype=self._numpy.uint8)
+        self._shard[row] = array.reshape(self._shape)
+        self._paths.append(path)
+        return f"{self._shards[-1]}[{row}]"
+
+    def close(self) -> None:
+        self._close_shard()
+        tmp_path = os.path.join(self._folder, f"{INDEX_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "shape": self._shape,
+                    "dtype": "uint8",
+                    "mode": self._mode,
+                    "shard_size": self._shard_size,
+                    "shards": self._shards,
+                    "paths": self._paths,
+                },
+                f,
+            )
+        os.replace(tmp_path, os.path.join(self._folder, INDEX_FILE))
+
+    def _next_shard(self) -> None:
+        self._close_shard()
+        name = SHARD_FILE.format(len(self._shards))
+        self._shard = self._numpy.lib.format.open_memmap(
+            os.path.join(self._folder, name),
+            mode="w+",
+            dtype=self._numpy.uint8,
+            shape=(self._shard_size, *self._shape),
+        )
+        self._shards.append(name)
+
+    def _close_shard(self) -> None:
+        if self._shard is None:
+            return
+        self._shard.flush()
+        rows = self.rows - (len(self._shards) - 1) * self._shard_size
+        if rows < self._shard_size:
+            # The last shard is only partly filled: rewrite it with its rows only
+            path = os.path.join(self._folder, self._shards[-1])
+            tmp_path = f"{path}.tmp"
+            shard = self._numpy.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=self._numpy.uint8, shape=(rows, *self._shape)
+            )
+            shard[:] = self._shard[:rows]
+            shard.flush()
+            del shard
+            os.replace(tmp_path, path)
+        self._shard = None
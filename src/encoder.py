@@ -0,0 +1,127 @@
+# Per-format encoder settings, trading encode time against output size, and a
+# target size mode that searches the highest quality fitting a byte budget.
+
+# Usage:
+# encoder = EncoderOptions(quality=80, method=2)
+# image.save("photo.webp", format=ImageFormat.WEBP, **encoder.kwargs(ImageFormat.WEBP))
+# data = fit_to_size(pil_image, ImageFormat.JPEG, target_bytes=50_000)
+
+import argparse
+from io import BytesIO
+from typing import Any
+
+from image import ImageFormat
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+SUBSAMPLING = ["4:4:4", "4:2:2", "4:2:0"]
+MIN_QUALITY = 1
+MAX_QUALITY = 95
+# Formats with a quality setting that target_bytes can search
+LOSSY_FORMATS = [ImageFormat.JPEG, ImageFormat.WEBP]
+
+
+class EncoderOptions:
+    def __init__(
+        self,
+        quality: int | None = None,
+        method: int | None = None,
+        lossless: bool = False,
+        progressive: bool = False,
+        optimize: bool = False,
+        subsampling: str | None = None,
+        compress_level: int | None = None,
+        target_bytes: int = 0,
+    ) -> None:
+        # None leaves Pillow's default for the format
+        self._check_range("Quality", quality, 1, 100)
+        self._check_range("WEBP method", method, 0, 6)
+        self._check_range("PNG compress level", compress_level, 0, 9)
+        if subsampling is not None and subsampling not in SUBSAMPLING:
+            raise ValueError(f"Subsampling must be one of {', '.join(SUBSAMPLING)}")
+        if target_bytes < 0:
+            raise ValueError("Target bytes must not be negative")
+        self.quality = quality
+        self.method = method
+        self.lossless = lossless
+        self.progressive = progressive
+        self.optimize = optimize
+        self.subsampling = subsampling
+        self.compress_level = compress_level
+        self.target_bytes = target_bytes
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "EncoderOptions":
+        return cls(
+            quality=args.quality,
+            method=args.webp_method,
+            lossless=args.lossless,
+            progressive=args.progressive,
+            optimize=args.optimize,
+            subsampling=args.subsampling,
+            compress_level=args.compress_level,
+            target_bytes=args.target_bytes,
+        )
+
+    def kwargs(self, format: ImageFormat) -> dict[str, Any]:
+        # Keyword arguments for Image.save() in the given format
+        options = {}
+        if format == ImageFormat.JPEG:
+            options = {
+                "quality": self.quality,
+                "progressive": self.progressive or None,
+                "optimize": self.optimize or None,
+                "subsampling": self.subsampling,
+            }
+        elif format == ImageFormat.WEBP:
+            options = {
+                "quality": self.quality,
+                "method": self.method,
+                "lossless": self.lossless or None,
+            }
+        elif format == ImageFormat.PNG:
+            options = {
+                "compress_level": self.compress_level,
+                "optimize": self.optimize or None,
+            }
+        return {key: value for key, value in options.items() if value is not None}
+
+    def target(self, format: ImageFormat) -> int:
+        # The byte budget, when it applies to the format
+        if format not in LOSSY_FORMATS or self.lossless:
+            return 0
+        return self.target_bytes
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(vars(self))
+
+    @staticmethod
+    def _check_range(name: str, value: int | None, low: int, high: int) -> None:
+        if value is not None and not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+
+
+def fit_to_size(
+    image: "Image.Image", format: ImageFormat, target_bytes: int, **kwargs
+) -> bytes:
+    # Binary search of the highest quality that encodes within target_bytes,
+    # falling back to the lowest quality when none does
+    kwargs.pop("quality", None)
+    low, high = MIN_QUALITY, MAX_QUALITY
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(image, format, quality=quality, **kwargs)
+        if len(data) <= target_bytes:
+            best = data
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best or _encode(image, format, quality=MIN_QUALITY, **kwargs)
+
+
+def _encode(image: "Image.Image", format: ImageFormat, **kwargs) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=format.value, **kwargs)
+    return buffer.getvalue()
@@ -5,20 +5,84 @@
 # for file in file_iterator("path/to/directory").walk():
 #     print(file)
 
+# Sub-directories are scanned concurrently by a pool of threads, feeding a
+# bounded queue that the caller consumes while the scan is still running.
+
+import fnmatch
+import itertools
 import os
-from os.path import join, splitext
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os.path import splitext
 from typing import Generator, Self
 
+from archive import archive_type
 from cli import CLI
 
+_SCAN_DONE = object()
+
+
+class _ScanState:
+    # Bounded queue of scan results, shared by the scanning threads, that is
+    # closed once the last pending directory has been scanned.
+    def __init__(self, queue_size: int) -> None:
+        self._results = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def put(self, item) -> None:
+        while not self.stopped:
+            try:
+                self._results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def started(self) -> None:
+        with self._lock:
+            self._pending += 1
+
+    def finished(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            done = self._pending == 0
+        if done:
+            self.put(_SCAN_DONE)
+
+    def __iter__(self) -> Generator[str, None, None]:
+        while (item := self._results.get()) is not _SCAN_DONE:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
 
 class FileIterator:
-    def __init__(self, arg: CLI | str) -> None:
+    def __init__(self, arg: CLI | str, queue_size: int = 1024) -> None:
         self._cli = arg if isinstance(arg, CLI) else CLI([arg, arg])
         args = self._cli.args
-        if self._is_valid_directory(args.input_folder):
+        # The members of an archive input are matched by their path in it
+        if self._is_valid_directory(args.input_folder) or archive_type(
+            args.input_folder
+        ):
             self._directory = args.input_folder
             self._filters: list[callable] = []
+            self._extensions: set[str] | None = None
+            self._include: re.Pattern | None = None
+            self._exclude: re.Pattern | None = None
+            self._max_depth: int | None = args.max_depth
+            self._workers: int = args.scan_workers
+            self._queue_size = queue_size
+            self.include(args.include).exclude(args.exclude)
             self._cli.verbose(f"Iterating files in: {self.directory}")
 
     @property
@@ -30,20 +94,149 @@ class FileIterator:
         return self
 
     def filter_by_extension(self, extensions: list[str]) -> Self:
-        def filter(file: str) -> bool:
-            _, ext = splitext(file)
-            return ext[1:] in extensions
-
+        if self._extensions is None:
+            self._extensions = set(extensions)
+        else:
+            self._extensions &= set(extensions)
         self._cli.debug(f"Filtering by extensions: {extensions}")
-        self.add_filter(filter)
         return self
 
+    def include(self, patterns: list[str]) -> Self:
+        # Glob patterns matched against the path relative to the directory, or
+        # the file name alone
+        if patterns:
+            self._include = self._compile_patterns(patterns)
+        return self
+
+    def exclude(self, patterns: list[str]) -> Self:
+        # Excluded directories are not descended into
+        if patterns:
+            self._exclude = self._compile_patterns(patterns)
+        return self
+
+    def max_depth(self, depth: int | None) -> Self:
+        # Depth 0 only yields the files directly in the directory
+        self._max_depth = depth
+        return self
+
+    def workers(self, workers: int) -> Self:
+        self._workers = workers
+        return self
+
+    def matches(self, file: str) -> bool:
+        # Whether walk() would yield file, e.g. for a file reported by a watcher
+        rel_path = os.path.relpath(file, self.directory).replace(os.sep, "/")
+        parts = rel_path.split("/")
+        if parts[0] == ".." or (
+            self._max_depth is not None and len(parts) - 1 > self._max_depth
+        ):
+            return False
+        for depth in range(1, len(parts)):
+            if self._is_excluded(parts[depth - 1], "/".join(parts[:depth])):
+                return False
+        return self._matches(parts[-1], rel_path)
+
+    def count(self, limit: int) -> int:
+        # Number of files walk() yields, counting no further than limit. The
+        # walk is serial, and stops as soon as it gets there.
+        return sum(1 for _ in itertools.islice(self._walk_serial(), limit))
+
     def walk(self) -> Generator[str, None, None]:
-        for root, dir, files in os.walk(self.directory):
-            for file in files:
-                if self._check_filter(file):
-                    self._cli.debug(f"Yielding file: {file}")
-                    yield join(root, file)
+        walker = self._walk_concurrent if self._workers > 1 else self._walk_serial
+        for file in walker():
+            self._cli.debug(f"Yielding file: {file}")
+            yield file
+
+    def _walk_serial(self) -> Generator[str, None, None]:
+        stack = [(self.directory, "", 0)]
+        while stack:
+            sub_dirs = []
+            for item in self._scan_directory(*stack.pop()):
+                if isinstance(item, tuple):
+                    sub_dirs.append(item)
+                else:
+                    yield item
+            stack.extend(reversed(sub_dirs))
+
+    def _walk_concurrent(self) -> Generator[str, None, None]:
+        state = _ScanState(self._queue_size)
+
+        def scan(path: str, rel_path: str, depth: int) -> None:
+            try:
+                for item in self._scan_directory(path, rel_path, depth):
+                    if state.stopped:
+                        break
+                    if isinstance(item, tuple):
+                        state.started()
+                        executor.submit(scan, *item)
+                    else:
+                        state.put(item)
+            except Exception as e:
+                state.put(e)
+            finally:
+                state.finished()
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            state.started()
+            executor.submit(scan, self.directory, "", 0)
+            try:
+                yield from state
+            finally:
+                state.stop()
+
+    def _scan_directory(
+        self, path: str, rel_path: str, depth: int
+    ) -> Generator[str | tuple[str, str, int], None, None]:
+        # Yield matching file paths, and (path, rel_path, depth) tuples for the
+        # sub-directories to descend into. Unreadable directories are skipped,
+        # as os.walk() does.
+        try:
+            with os.scandir(path) as entries:
+                entries = list(entries)
+        except OSError as e:
+            self._cli.debug(f"Skipping directory: {e}")
+            return
+
+        descend = self._max_depth is None or depth < self._max_depth
+        for entry in entries:
+            entry_rel_path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if (
+                    descend
+                    and not entry.is_symlink()
+                    and not self._is_excluded(entry.name, entry_rel_path)
+                ):
+                    yield entry.path, entry_rel_path, depth + 1
+            elif self._matches(entry.name, entry_rel_path):
+                yield entry.path
+
+    def _matches(self, name: str, rel_path: str) -> bool:
+        if (
+            self._extensions is not None
+            and splitext(name)[1][1:] not in self._extensions
+        ):
+            return False
+        if self._include and not (
+            self._include.match(rel_path) or self._include.match(name)
+        ):
+            return False
+        if self._is_excluded(name, rel_path):
+            return False
+        return self._check_filter(name)
+
+    def _is_excluded(self, name: str, rel_path: str) -> bool:
+        return bool(
+            self._exclude
+            and (self._exclude.match(rel_path) or self._exclude.match(name))
+        )
+
+    @staticmethod
+    def _compile_patterns(patterns: list[str]) -> re.Pattern:
+        return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
 
     def _is_valid_directory(self, directory_path: str) -> bool:
         # check if directory exists and readable
@@ -0,0 +1,84 @@
+import io
+import os
+import shutil
+import uuid
+from typing import IO, Any, Callable
+
+
+def link_or_copy(src: str, dest: str, link: bool = True) -> str:
+    # Hardlink `src` to `dest` when possible, falling back to a byte copy. On
+    # Linux, copyfile() uses copy_file_range(), which file systems such as
+    # Btrfs and XFS can serve as a reflink without duplicating any data.
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if link:
+        try:
+            os.link(src, dest)
+            return dest
+        except OSError:
+            pass
+    shutil.copyfile(src, dest)
+    return dest
+
+
+def write_atomic(path: str, data: bytes | Callable[[IO[bytes]], Any]) -> str:
+    # Write to a temporary file next to `path` and rename it into place, so
+    # that readers never see a partly written file. data is the content, or a
+    # function writing it to the open file, e.g. to encode an image into it.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+class BufferReader(io.BufferedIOBase):
+    # Read-only, seekable file object over a bytes-like buffer, so that images
+    # can be decoded from memory without copying the whole buffer first as
+    # BytesIO does for bytearray and memoryview objects.
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        self._data = memoryview(data).cast("B")
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int | None = -1) -> bytes:
+        end = len(self._data) if size is None or size < 0 else self._pos + size
+        chunk = self._data[self._pos : end]
+        self._pos += len(chunk)
+        return chunk.tobytes()
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, buffer) -> int:
+        chunk = self._data[self._pos : self._pos + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._data)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
@@ -1,3 +1,4 @@
+import os
 import re
 from enum import Enum
 
@@ -11,6 +12,60 @@ class ImageFormat(Enum):
     TIFF = "TIFF"
     WEBP = "WEBP"
 
+    @classmethod
+    def from_extension(cls, path: str) -> "ImageFormat | None":
+        ext = os.path.splitext(path)[1].lower()
+        return FORMAT_EXTENSIONS.get(ext)
+
+    @property
+    def plugin(self) -> str | None:
+        # Pillow plugin module, importing it registers the format without
+        # Pillow importing every other plugin to find it
+        return f"PIL.{PLUGINS[self.value]}" if self.value else None
+
+
+FORMAT_EXTENSIONS = {
+    ".jpg": ImageFormat.JPEG,
+    ".jpeg": ImageFormat.JPEG,
+    ".png": ImageFormat.PNG,
+    ".bmp": ImageFormat.BMP,
+    ".gif": ImageFormat.GIF,
+    ".tif": ImageFormat.TIFF,
+    ".tiff": ImageFormat.TIFF,
+    ".webp": ImageFormat.WEBP,
+}
+PLUGINS = {
+    "JPEG": "JpegImagePlugin",
+    "PNG": "PngImagePlugin",
+    "BMP": "BmpImagePlugin",
+    "GIF": "GifImagePlugin",
+    "TIFF": "TiffImagePlugin",
+    "WEBP": "WebPImagePlugin",
+}
+
+
+class ResampleFilter(Enum):
+    NEAREST = "NEAREST"
+    BOX = "BOX"
+    BILINEAR = "BILINEAR"
+    HAMMING = "HAMMING"
+    BICUBIC = "BICUBIC"
+    LANCZOS = "LANCZOS"
+
+
+# Resampling filter and reducing gap of each quality profile. A reducing gap
+# first shrinks the image by an integer factor with a box filter, which is
+# much faster on large downscales; None resamples at full quality.
+QUALITY_PROFILES = {
+    "fast": (ResampleFilter.BILINEAR, 2.0),
+    "balanced": (ResampleFilter.BICUBIC, 3.0),
+    "best": (ResampleFilter.LANCZOS, None),
+}
+
+# Modes that Image.reduce() supports: palette and bilevel pixels cannot be
+# averaged
+REDUCE_MODES = ["L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F"]
+
 
 class ImageSizeUnit:
     def __init__(self, value: str | int):
@@ -45,3 +100,91 @@ class ImageSizeUnit:
 
     def __repr__(self) -> str:
         return f"ImageSizeUnit({self.value}{self.unit})"
+
+
+class OutputSpec:
+    KEYS = {
+        "name": "name",
+        "width": "width",
+        "w": "width",
+        "height": "height",
+        "h": "height",
+        "max_size": "max_size",
+        "max": "max_size",
+        "format": "format",
+        "f": "format",
+    }
+
+    def __init__(
+        self,
+        name: str = "",
+        width: ImageSizeUnit | int | str = 0,
+        height: ImageSizeUnit | int | str = 0,
+        max_size: ImageSizeUnit | int | str = 0,
+        format: ImageFormat | str = ImageFormat.WEBP,
+    ):
+        self._name = name
+        self._width = ImageSizeUnit(str(width))
+        self._height = ImageSizeUnit(str(height))
+        self._max_size = ImageSizeUnit(str(max_size))
+        try:
+            self._format = (
+                format
+                if isinstance(format, ImageFormat)
+                else ImageFormat[format.upper()]
+            )
+        except KeyError:
+            raise ValueError("Invalid image format")
+
+    @classmethod
+    def parse(cls, spec: str) -> "OutputSpec":
+        # Parse an output spec such as "name=thumb,max=200,format=JPEG"
+        values = {}
+        for item in spec.split(","):
+            key, sep, value = item.partition("=")
+            key = key.strip().lower().replace("-", "_")
+            if not sep or key not in cls.KEYS:
+                raise ValueError(f"Invalid output spec ({spec}): unknown item {item}")
+            values[cls.KEYS[key]] = value.strip()
+        return cls.from_dict(values)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "OutputSpec":
+        unknown = set(values) - set(cls.KEYS.values())
+        if unknown:
+            raise ValueError(f"Invalid output spec: unknown keys {sorted(unknown)}")
+        spec = cls(**values)
+        if not spec.width.value and not spec.height.value and not spec.max_size.value:
+            raise ValueError(
+                f"At least one of width, height or max-size is required ({spec})"
+            )
+        return spec
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def width(self) -> ImageSizeUnit:
+        return self._width
+
+    @property
+    def height(self) -> ImageSizeUnit:
+        return self._height
+
+    @property
+    def max_size(self) -> ImageSizeUnit:
+        return self._max_size
+
+    @property
+    def format(self) -> ImageFormat:
+        return self._format
+
+    def __str__(self) -> str:
+        return (
+            f"name={self.name},width={self.width},height={self.height},"
+            f"max_size={self.max_size},format={self.format.value}"
+        )
+
+    def __repr__(self) -> str:
+        return f"OutputSpec({self})"
@@ -1,34 +1,101 @@
+import copy
+import importlib
 import os
-from typing import Any, Self
-
-from PIL import Image
+from contextlib import AbstractContextManager, nullcontext
+from io import BytesIO
+from typing import IO, Any, Generator, Self
 
+from animation import ANIMATED_FORMATS, AnimatedFrames, is_animated
 from cli import CLI
-from image import ImageFormat, ImageSizeUnit
+from encoder import fit_to_size
+from file_utils import BufferReader, write_atomic
+from image import (
+    REDUCE_MODES,
+    ImageFormat,
+    ImageSizeUnit,
+    OutputSpec,
+    ResampleFilter,
+)
+from lazy import lazy_import
+from planner import (
+    CONVERT,
+    RESIZE,
+    ROTATE,
+    Operation,
+    is_cheaper_to_convert_first,
+    plan_operations,
+)
+from stats import FileStats
+
+Image = lazy_import("PIL.Image")
+
+
+def _load_plugin(format: ImageFormat | None) -> None:
+    # Pillow only registers a few common formats up front, and imports every
+    # one of its plugins the first time it meets another format
+    if format and format.plugin:
+        importlib.import_module(format.plugin)
 
 
 class ImageManipulator:
-    def __init__(self, img_path: str, cli: CLI | None = None):
-        self._cli = cli if cli else CLI()
+    # resize, convert and rotate only plan the operation. The plan runs, in the
+    # cheapest order, when the pixels are needed: on save or image access.
+
+    def __init__(
+        self,
+        img_path: str | IO[bytes],
+        cli: CLI | None = None,
+        stats: FileStats | None = None,
+    ):
+        # img_path is a path on disk or a readable binary file object
+        self._cli = cli
         self._src_img = img_path
         self._image = None
-        self._size = None
-        if not os.path.exists(img_path):
-            raise FileNotFoundError(f"File not found at {img_path}")
+        self._plan: list[Operation] = []
+        self._planned_size: tuple[int, int] | None = None
+        self._stats = stats
+        if self._is_path(img_path):
+            if not os.path.exists(img_path):
+                raise FileNotFoundError(f"File not found at {img_path}")
+            if stats:
+                stats.bytes_in += os.path.getsize(img_path)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes | bytearray | memoryview,
+        cli: CLI | None = None,
+        stats: FileStats | None = None,
+    ) -> Self:
+        # bytes are shared by BytesIO without a copy, other buffers are read
+        # in place through a memoryview
+        reader = BytesIO(data) if isinstance(data, bytes) else BufferReader(data)
+        if stats:
+            stats.bytes_in += len(memoryview(data).cast("B"))
+        return cls(reader, cli, stats)
 
     @property
-    def image(self) -> Image.Image:
-        if not self._image:
-            self._image = Image.open(self._src_img)
-            self._size = self._image.size
-            self._cli.verbose(
-                f"Opened image: {self._src_img} ({self._size[0]}x{self._size[1]})"
-            )
-        return self._image
+    def image(self) -> "Image.Image":
+        self._apply_plan()
+        return self._opened()
+
+    @property
+    def source(self) -> str | IO[bytes]:
+        return self._src_img
 
     @property
     def size(self) -> tuple[int, int]:
-        return self.image.size
+        # The size once planned operations have run, read from the header only
+        return self._planned_size or self._opened().size
+
+    @property
+    def format(self) -> str | None:
+        return self.image.format
+
+    @property
+    def is_animated(self) -> bool:
+        # False once planned operations have flattened the image to one frame
+        return is_animated(self._opened())
 
     @property
     def width(self) -> int:
@@ -43,18 +110,112 @@ class ImageManipulator:
         width: ImageSizeUnit | int | str,
         height: ImageSizeUnit | int | str,
         max_size: ImageSizeUnit | int = 0,
+        draft: float = 0,
+        filter: ResampleFilter | None = None,
+        reducing_gap: float | None = None,
     ) -> Self:
-        o_width = self.width
-        o_height = self.height
-        self._image = self.image.resize(self._get_new_size(width, height, max_size))
-        self._cli.verbose(
-            f"Resized image from {o_width}x{o_height} to {self.width}x{self.height}"
-        )
+        # filter defaults to Pillow's bicubic, see QUALITY_PROFILES for
+        # reducing_gap
+        new_size = self._get_new_size(width, height, max_size)
+        self._plan.append((RESIZE, (new_size, draft, filter, reducing_gap)))
+        self._planned_size = new_size
         return self
 
+    def is_unchanged_by(self, output: OutputSpec, mode: str | None = None) -> bool:
+        # Only reads the image header: true when the output would have the same
+        # size, format and mode as the source file.
+        return (
+            self._get_new_size(output.width, output.height, output.max_size)
+            == self.size
+            and self.format == output.format.value
+            and mode in (None, self.image.mode)
+        )
+
+    def copy(self) -> Self:
+        # Operations replace the underlying image rather than mutating it, so the
+        # copy can share it until one of them is applied. Planned operations run
+        # first, so that they are not repeated by every copy. The operations of
+        # animations only run frame by frame on save.
+        if not self.is_animated:
+            self._apply_plan()
+        clone = copy.copy(self)
+        clone._plan = list(self._plan)
+        return clone
+
+    def renditions(
+        self,
+        outputs: list[OutputSpec],
+        draft: float = 0,
+        mode: str | None = None,
+        release: bool = False,
+        filter: ResampleFilter | None = None,
+        reducing_gap: float | None = None,
+    ) -> Generator[tuple[OutputSpec, Self], None, None]:
+        # Sizes are all relative to the source image, largest rendition first, so
+        # that each smaller rendition can be resized from the previous one. With
+        # release, images that are no longer needed as a source are freed as
+        # soon as possible, including the source image itself. The frames of an
+        # animation are all resized from the source, one at a time on save.
+        animated = self.is_animated
+        sizes = [
+            (output, self._get_new_size(output.width, output.height, output.max_size))
+            for output in outputs
+        ]
+        sizes.sort(key=lambda item: item[1][0] * item[1][1], reverse=True)
+        convert_first = (
+            mode and sizes and is_cheaper_to_convert_first(self._opened().mode, mode)
+        )
+        if draft and sizes and not animated:
+            self._draft(sizes[0][1], draft, mode if convert_first else None)
+        if convert_first:
+            self.convert(mode)
+
+        from_previous = [
+            not animated
+            and i > 0
+            and sizes[i - 1][1][0] >= size[0]
+            and sizes[i - 1][1][1] >= size[1]
+            for i, (_, size) in enumerate(sizes)
+        ]
+        last_from_self = max(
+            (i for i, previous in enumerate(from_previous) if not previous), default=-1
+        )
+
+        previous = None
+        for i, (output, size) in enumerate(sizes):
+            source = previous if from_previous[i] else self
+            rendition = source.copy().resize(
+                *size, filter=filter, reducing_gap=reducing_gap
+            )
+            if mode:
+                rendition.convert(mode)
+            if release and not animated:
+                # Build the rendition before freeing the images it is built from
+                rendition._apply_plan()
+                # A resize to the current size is dropped, and the rendition
+                # then shares the image of its source: keep it open
+                in_use = [rendition._image]
+                if i < last_from_self:
+                    in_use.append(self._image)
+                if previous and all(previous._image is not im for im in in_use):
+                    previous.release()
+                if i == last_from_self and self._image is not rendition._image:
+                    self.release()
+            yield output, rendition
+            previous = rendition
+        if release and animated:
+            self.release()
+
+    def release(self) -> None:
+        # Free the pixel memory now rather than when garbage collected. The
+        # image cannot be used afterwards.
+        self._plan = []
+        if self._image:
+            self._image.close()
+            self._verbose(f"Released image: {self._src_img}")
+
     def convert(self, mode: str) -> Self:
-        self._image = self.image.convert(mode)
-        self._cli.verbose(f"Converted image to: {mode}")
+        self._plan.append((CONVERT, (mode,)))
         return self
 
     def downscale_to_rgb(self) -> Self:
@@ -64,23 +225,207 @@ class ImageManipulator:
         return self.convert("L")
 
     def rotate(self, angle: int) -> Self:
-        self._image = self.image.rotate(angle)
-        self._cli.verbose(f"Rotated image by: {angle} degrees")
+        self._plan.append((ROTATE, (angle,)))
         return self
 
     def save(
         self,
-        dest_path: str | None = None,
+        dest_path: str | IO[bytes] | None = None,
         format: ImageFormat = ImageFormat.Default,
+        target_bytes: int = 0,
         **kwargs,
     ) -> Self:
+        # dest_path is a path on disk or a writable binary file object, which
+        # requires an explicit format. With target_bytes, the quality is the
+        # highest that fits the budget.
         if dest_path is None:
             dest_parts = os.path.splitext(self._src_img)
             dest_path = dest_parts[0] + "-rexised" + dest_parts[1]
-        self._cli.verbose(f"Saving image to: {dest_path}")
-        self.image.save(dest_path, format=format.value, **kwargs)
+        is_path = self._is_path(dest_path)
+        if is_path:
+            self._verbose(f"Saving image to: {dest_path}")
+            format = self._path_format(dest_path, format)
+        start = 0 if is_path else dest_path.tell()
+
+        image = self._animation(format)
+        if image is None:
+            self._apply_plan()
+            image = self._decoded()
+        with self._time("save"):
+            if is_path:
+                self._save_atomic(image, dest_path, format, target_bytes, **kwargs)
+            else:
+                self._write(image, dest_path, format, target_bytes, **kwargs)
+        if self._stats:
+            end = os.path.getsize(dest_path) if is_path else dest_path.tell()
+            self._stats.bytes_out += end - start
         return self
 
+    def to_bytes(self, format: ImageFormat, target_bytes: int = 0, **kwargs) -> bytes:
+        buffer = BytesIO()
+        self.save(buffer, format=format, target_bytes=target_bytes, **kwargs)
+        # getvalue() hands over the internal buffer without copying it
+        return buffer.getvalue()
+
+    def _save_atomic(
+        self,
+        image: "Image.Image | AnimatedFrames",
+        dest_path: str,
+        format: ImageFormat,
+        target_bytes: int = 0,
+        **kwargs,
+    ) -> None:
+        # An interrupted run never leaves a truncated image behind. Renaming
+        # also replaces, rather than writes through, a hardlink left by
+        # passthrough.
+        write_atomic(
+            dest_path, lambda f: self._write(image, f, format, target_bytes, **kwargs)
+        )
+
+    @staticmethod
+    def _path_format(dest_path: str, format: ImageFormat) -> ImageFormat:
+        if format.value is None:
+            format = ImageFormat.from_extension(dest_path)
+            if not format:
+                raise ValueError(f"Unknown image format for: {dest_path}")
+        return format
+
+    @staticmethod
+    def _write(
+        image: "Image.Image | AnimatedFrames",
+        dest: IO[bytes],
+        format: ImageFormat,
+        target_bytes: int = 0,
+        **kwargs,
+    ) -> None:
+        _load_plugin(format)
+        if target_bytes:
+            dest.write(fit_to_size(image, format, target_bytes, **kwargs))
+        else:
+            image.save(dest, format=format.value, **kwargs)
+
+    def _animation(self, format: ImageFormat) -> AnimatedFrames | None:
+        # Animated sources keep all their frames in the formats that can hold
+        # them, and are otherwise flattened to their first frame
+        if format not in ANIMATED_FORMATS or not self.is_animated:
+            return None
+        frames = AnimatedFrames(self._opened(), self._plan)
+        self._verbose(f"Saving animation of: {frames.n_frames} frames")
+        return frames
+
+    def _opened(self) -> "Image.Image":
+        if not self._image:
+            with self._time("open"):
+                if self._is_path(self._src_img):
+                    _load_plugin(ImageFormat.from_extension(self._src_img))
+                self._image = Image.open(self._src_img)
+            width, height = self._image.size
+            self._verbose(f"Opened image: {self._src_img} ({width}x{height})")
+        return self._image
+
+    def _apply_plan(self) -> None:
+        if not self._plan:
+            return
+        image = self._opened()
+        plan = plan_operations(self._plan, image.size, image.mode)
+        self._plan = []
+        self._planned_size = None
+        if plan:
+            self._verbose(f"Planned operations: {plan}")
+        self._draft_plan(plan)
+        for name, args in plan:
+            getattr(self, f"_{name}")(*args)
+
+    def _draft_plan(self, plan: list[Operation]) -> None:
+        # The decoder can only draft once: give it the leading conversion and
+        # the draft of the first resize together
+        mode = None
+        for name, args in plan:
+            if name == CONVERT and mode is None:
+                mode = args[0]
+                continue
+            if name == RESIZE and args[1]:
+                self._draft(args[0], args[1], mode)
+                return
+            break
+        if mode:
+            self._draft(None, 0, mode)
+
+    def _resize(
+        self,
+        size: tuple[int, int],
+        draft: float = 0,
+        filter: ResampleFilter | None = None,
+        reducing_gap: float | None = None,
+    ) -> None:
+        if draft:
+            self._draft(size, draft)
+        image = self._decoded()
+        resample = Image.Resampling[filter.value] if filter else None
+        with self._time("resize"):
+            self._image = image.resize(size, resample, reducing_gap=reducing_gap)
+        self._verbose(
+            f"Resized image from {image.width}x{image.height} to {size[0]}x{size[1]}"
+        )
+
+    def _convert(self, mode: str) -> None:
+        if self._opened().mode == mode:
+            return
+        image = self._decoded()
+        with self._time("convert"):
+            self._image = image.convert(mode)
+        self._verbose(f"Converted image to: {mode}")
+
+    def _rotate(self, angle: int) -> None:
+        self._image = self._decoded().rotate(angle)
+        self._verbose(f"Rotated image by: {angle} degrees")
+
+    def _decoded(self) -> "Image.Image":
+        # Image.open() only reads the header, the pixels are decoded on load()
+        image = self._opened()
+        with self._time("decode"):
+            image.load()
+        return image
+
+    def _verbose(self, *args, **kwargs):
+        if self._cli:
+            self._cli.verbose(*args, **kwargs)
+
+    @staticmethod
+    def _is_path(value: Any) -> bool:
+        return isinstance(value, (str, os.PathLike))
+
+    def _time(self, stage: str) -> AbstractContextManager:
+        return self._stats.time(stage) if self._stats else nullcontext()
+
+    def _draft(
+        self, size: tuple[int, int] | None, reducing_gap: float, mode: str | None = None
+    ) -> None:
+        # Decode (JPEG) or reduce (other formats) at a lower scale that is still
+        # at least `reducing_gap` times the target size, so the final resample
+        # has far fewer pixels to process. A gap of 1.0 is the fastest. JPEG
+        # can also decode straight to grayscale.
+        target = None
+        if size:
+            target = (int(size[0] * reducing_gap), int(size[1] * reducing_gap))
+        image = self._opened()
+        if image.format == "JPEG":
+            if image.draft(mode, target):
+                self._verbose(
+                    f"Draft decoding image at: {image.width}x{image.height} "
+                    f"{image.mode}"
+                )
+            return
+
+        if not target or image.mode not in REDUCE_MODES:
+            # Palette and bilevel images are resized with the nearest
+            # neighbour anyway
+            return
+        factor = int(min(image.width / target[0], image.height / target[1]))
+        if factor >= 2:
+            self._image = image.reduce(factor)
+            self._verbose(f"Reduced image by a factor of: {factor}")
+
     def _get_new_size(
         self,
         width: ImageSizeUnit | int | str,
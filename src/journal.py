@@ -0,0 +1,103 @@
+# Checkpoint journal of the source files completed by a run, appended and
+# flushed as each file is done. A run restarted with --resume skips the files
+# in the journal without statting or decoding them. A line cut short by a
+# crash is ignored, and the journal is only reused with the same parameters.
+
+# Usage:
+# journal = Journal(output_folder, input_folder, params, resume=True)
+# for file in journal.pending(files):
+#     ...
+#     journal.record(file)
+# journal.close()
+
+import os
+from typing import Any, Generator, Iterable
+
+from file_utils import write_atomic
+from manifest import params_fingerprint
+
+JOURNAL_FILE = ".rexize-journal"
+JOURNAL_HEADER = "# rexize journal v1 "
+
+
+def merge_journals(paths: list[str], dest: str) -> None:
+    # Combine the journals of the shards of a run, which all share its header,
+    # with the journal already at dest, if any
+    header = None
+    lines: dict[str, None] = {}
+    for path in [dest, *paths]:
+        if path == dest and not os.path.exists(dest):
+            continue
+        with open(path) as f:
+            if header is None:
+                header = f.readline()
+            elif f.readline() != header:
+                raise ValueError(f"Journal of a run with other options: {path}")
+            # The last item is empty, or a line cut short by a crash
+            lines.update(dict.fromkeys(f.read().split("\n")[:-1]))
+    write_atomic(dest, "".join([header, *(f"{line}\n" for line in lines)]).encode())
+
+
+class Journal:
+    def __init__(
+        self,
+        output_folder: str,
+        input_folder: str,
+        params: dict[str, Any],
+        resume: bool = False,
+        file_name: str = JOURNAL_FILE,
+    ) -> None:
+        self._path = os.path.join(output_folder, file_name)
+        self._input_folder = input_folder
+        self._header = f"{JOURNAL_HEADER}{params_fingerprint(params)}\n"
+        self._completed: set[str] = self._load() if resume else set()
+        self.skipped = 0
+        if self._completed:
+            self._file = open(self._path, "a")
+        else:
+            self._file = open(self._path, "w")
+            self._file.write(self._header)
+            self._file.flush()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def completed(self) -> int:
+        return len(self._completed)
+
+    def pending(self, files: Iterable[str]) -> Generator[str, None, None]:
+        for file in files:
+            if self._key(file) in self._completed:
+                self.skipped += 1
+            else:
+                yield file
+
+    def record(self, file: str) -> None:
+        # One write per line, so a crash can at worst cut the last line short.
+        # A file processed again, e.g. by --watch, is only recorded once.
+        key = self._key(file)
+        if key in self._completed:
+            return
+        self._completed.add(key)
+        self._file.write(f"{key}\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def _load(self) -> set[str]:
+        if not os.path.exists(self._path):
+            return set()
+        with open(self._path) as f:
+            if f.readline() != self._header:
+                return set()
+            lines = f.read().split("\n")
+        # The last item is empty, or a line cut short by a crash
+        return set(lines[:-1])
+
+    def _key(self, file: str) -> str:
+        return os.path.relpath(file, self._input_folder)
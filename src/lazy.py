@@ -0,0 +1,24 @@
+# Deferred imports, to keep the start-up of short runs fast: the module is
+# only executed on first attribute access.
+
+# Usage:
+# Image = lazy_import("PIL.Image")
+# Image.open(path)  # PIL.Image is imported here
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,76 +1,541 @@
 #!/usr/bin/env python3
 
 import os
+import shutil
+import signal
 import sys
 import traceback
+from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from contextlib import nullcontext
+from io import BytesIO
+from typing import IO, Generator
 
 sys.path.append(os.path.dirname(__file__))
 
+from archive import ArchiveReader, ArchiveWriter  # noqa: E402
 from cli import CLI  # noqa: E402
+from dataset import ShardWriter  # noqa: E402
 from file_iterator import FileIterator  # noqa: E402
+from file_utils import link_or_copy, write_atomic  # noqa: E402
+from image import OutputSpec  # noqa: E402
 from image_manipulator import ImageManipulator  # noqa: E402
+from journal import JOURNAL_FILE, Journal  # noqa: E402
+from manifest import MANIFEST_FILE, Manifest, params_from_args  # noqa: E402
+from memory_budget import MemoryBudget  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from staged import StagedPipeline  # noqa: E402
+from stats import FileStats, Stats  # noqa: E402
+from tiler import TilePyramid  # noqa: E402
+from watcher import Watcher  # noqa: E402
+
+IMAGE_EXTENSIONS = ["jpg", "jpeg", "png", "webp", "gif", "tiff", "bmp"]
 
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        from server import serve_main
+
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["merge"]:
+        from sharding import merge_main
+
+        sys.exit(merge_main(sys.argv[2:]))
+
     try:
-        cli = CLI().parse_args().validate_args()
+        cli = CLI().parse_args()
     except Exception as e:
         print(e, file=sys.stderr)
         sys.exit(55)
 
     try:
-        file_iter = FileIterator(cli.args.input_folder).filter_by_extension(
-            ["jpg", "jpeg", "png", "webp", "gif", "tiff", "bmp"]
-        )
-        file_count = 0
-        for file in file_iter.walk():
-            image = ImageManipulator(file)
-            cli.debug(f"Processing: {cli.args}")
-            image.resize(cli.args.width, cli.args.height, cli.args.max_size)
-            if cli.args.rgb:
-                image.downscale_to_rgb()
-            if cli.args.grayscale:
-                image.downscale_to_grayscale()
-
-            out_file = get_output_file(file, cli.args)
-            cli.print(f"{file} --> {out_file}")
-            file_count += 1
-            image.save(out_file)
-
-        cli.print(f"Processed {file_count} files.")
-        cli.exit()
+        if cli.streaming:
+            process_stream(cli)
+            cli.exit()
+
+        batch = process_folder(cli)
+        cli.exit(1 if batch.failed_count else 0)
 
+    except KeyboardInterrupt:
+        cli.exit(130)
     except Exception as e:
         cli.exception(e)
         cli.debug(traceback.format_exc())
         cli.exit(1)
 
 
-def get_output_file(file: str, args) -> str:
+class Batch:
+    # Tracks the results of a run: progress output, counts, the checkpoint
+    # journal, the incremental manifest, the --npy shards, the output archive
+    # and the --stats report.
+    def __init__(self, cli: CLI) -> None:
+        self.cli = cli
+        self.file_count = 0
+        self.failed_count = 0
+        self.journal = None
+        self.manifest = None
+        self.dataset = None
+        self.archive = None
+        self.stats = Stats(cli.args.stats_slowest) if cli.args.stats else None
+        # Shards of a run sharing the output folder keep their own journal and
+        # manifest, see rexize merge
+        shard = cli.args.shard
+        if cli.archive_output:
+            self.archive = ArchiveWriter(cli.args.output_folder)
+        else:
+            self.journal = Journal(
+                cli.args.output_folder,
+                cli.args.input_folder,
+                params_from_args(cli.args),
+                resume=cli.args.resume,
+                file_name=shard.file_name(JOURNAL_FILE) if shard else JOURNAL_FILE,
+            )
+        if cli.args.incremental:
+            self.manifest = Manifest(
+                cli.args.output_folder,
+                cli.args.input_folder,
+                params_from_args(cli.args),
+                use_hash=cli.args.hash,
+                file_name=shard.file_name(MANIFEST_FILE) if shard else MANIFEST_FILE,
+            )
+        if cli.args.npy:
+            self.dataset = ShardWriter(
+                cli.args.output_folder,
+                cli.args.width.value,
+                cli.args.height.value,
+                mode="L" if cli.args.grayscale else "RGB",
+                shard_size=cli.args.npy,
+            )
+
+    def done(
+        self, file: str, out_files: list[str] | bytes, file_stats: FileStats | None
+    ):
+        if self.dataset:
+            # Exported images come back as pixels, written to the shards here
+            rel_path = os.path.relpath(file, self.cli.args.input_folder)
+            out_files = [self.dataset.add(out_files, rel_path)]
+        self.file_count += 1
+        self.cli.print(f"{file} --> {', '.join(out_files)}")
+        if self.manifest:
+            self.manifest.update(file, out_files)
+        if self.stats and file_stats:
+            self.stats.add(file_stats)
+        if self.journal:
+            self.journal.record(file)
+
+    def fail(self, file: str, error: Exception):
+        self.failed_count += 1
+        self.cli.error(f"Failed to process {file}: {error}")
+
+    def close(self, completed: bool = True):
+        # An output archive is only published by a run that completed, rather
+        # than replacing the previous one with part of the outputs
+        if self.manifest:
+            self.manifest.save()
+        if self.dataset:
+            self.dataset.close()
+        if self.archive:
+            self.archive.close(commit=completed)
+        if self.journal:
+            self.journal.close()
+
+        self.cli.print(f"Processed {self.file_count} files.")
+        if self.journal and self.journal.skipped:
+            self.cli.print(f"Resumed after {self.journal.skipped} completed files.")
+        if self.manifest and self.manifest.skipped:
+            self.cli.print(f"Skipped {self.manifest.skipped} unchanged files.")
+        if self.failed_count:
+            self.cli.error(f"Failed to process {self.failed_count} files.")
+        if self.stats:
+            self._write_stats()
+
+    def _write_stats(self):
+        if self.cli.args.stats == "-":
+            print(self.stats.report())
+        else:
+            with open(self.cli.args.stats, "w") as f:
+                f.write(self.stats.to_json())
+
+
+def process_file(file: str, cli: CLI) -> tuple[list[str] | bytes, FileStats | None]:
+    if cli.args.npy:
+        return export_file(file, cli)
+    if cli.args.tiles:
+        return tile_file(file, cli)
+    pipeline = Pipeline.from_args(cli.args)
+    file_stats = FileStats(file) if cli.args.stats else None
+    image = pipeline.open(file, cli, file_stats)
+    cli.debug(f"Processing: {cli.args}")
+    outputs, unchanged = split_unchanged(file, image, pipeline, cli)
+    out_files = []
+    for out_file in unchanged:
+        link_or_copy(file, out_file, link=cli.args.passthrough == "link")
+        cli.verbose(f"Passed through unchanged image to: {out_file}")
+        out_files.append(out_file)
+
+    dests = {output.name: get_output_file(file, cli.args, output) for output in outputs}
+    pipeline.process_all(image, dests, outputs)
+    out_files.extend(dests.values())
+    return out_files, file_stats
+
+
+def split_unchanged(
+    file: str, image: ImageManipulator, pipeline: Pipeline, cli: CLI
+) -> tuple[list[OutputSpec], list[str]]:
+    # The outputs to render, and the output files to pass through unchanged
+    outputs = pipeline.outputs
+    if not cli.args.passthrough:
+        return outputs, []
+    unchanged = [o for o in outputs if image.is_unchanged_by(o, pipeline.mode)]
+    outputs = [output for output in outputs if output not in unchanged]
+    if cli.args.passthrough == "skip":
+        if unchanged:
+            cli.verbose(f"Skipping unchanged image: {file}")
+        return outputs, []
+    return outputs, [get_output_file(file, cli.args, output) for output in unchanged]
+
+
+def read_file(
+    file: str, cli: CLI, archive: ArchiveReader | None = None
+) -> tuple[bytes, FileStats | None]:
+    # Files of an archive input are read from the archive, by their path in it
+    file_stats = FileStats(file) if cli.args.stats else None
+    with file_stats.time("read") if file_stats else nullcontext():
+        if archive:
+            return archive.read(os.path.relpath(file, archive.path)), file_stats
+        with open(file, "rb") as f:
+            return f.read(), file_stats
+
+
+def render_file(
+    file: str, data: bytes, file_stats: FileStats | None, cli: CLI
+) -> tuple[dict[str, bytes | None], FileStats | None]:
+    # Encoded outputs of an image read by read_file(), keyed by output file, or
+    # by path in the output archive. None marks an output passed through from
+    # the source file.
+    pipeline = Pipeline.from_args(cli.args)
+    image = pipeline.open(data, cli, file_stats)
+    outputs, unchanged = split_unchanged(file, image, pipeline, cli)
+    writes = dict.fromkeys(unchanged)
+    results = pipeline.process_all(image, {}, outputs)
+    for output in outputs:
+        if cli.archive_output:
+            out_file = get_output_name(file, cli.args, output)
+        else:
+            out_file = get_output_file(file, cli.args, output)
+        writes[out_file] = results[output.name]
+    return writes, file_stats
+
+
+def write_outputs(
+    file: str,
+    rendered: tuple[dict[str, bytes | None], FileStats | None],
+    cli: CLI,
+    archive: ArchiveWriter | None = None,
+) -> tuple[list[str], FileStats | None]:
+    # Outputs are appended to the output archive when there is one
+    writes, file_stats = rendered
+    for out_file, data in writes.items():
+        if data is None:
+            link_or_copy(file, out_file, link=cli.args.passthrough == "link")
+            continue
+        with file_stats.time("write") if file_stats else nullcontext():
+            if archive:
+                archive.add(out_file, data)
+            else:
+                write_atomic(out_file, data)
+        if file_stats:
+            file_stats.bytes_out += len(data)
+    return list(writes), file_stats
+
+
+def export_file(file: str, cli: CLI) -> tuple[bytes, FileStats | None]:
+    # Raw pixels of the resized image, for a row of the --npy shards
+    pipeline = Pipeline.from_args(cli.args)
+    file_stats = FileStats(file) if cli.args.stats else None
+    image = pipeline.open(file, cli, file_stats)
+    _, rendition = next(pipeline.render(image))
+    return rendition.image.tobytes(), file_stats
+
+
+def tile_file(file: str, cli: CLI) -> tuple[list[str], FileStats | None]:
+    # Deep Zoom pyramid of the resized image: a .dzi descriptor next to a
+    # folder of tiles, in place of the output image file
+    pipeline = Pipeline.from_args(cli.args)
+    file_stats = FileStats(file) if cli.args.stats else None
+    image = pipeline.open(file, cli, file_stats)
+    _, rendition = next(pipeline.render(image))
+    format = pipeline.outputs[0].format
+    pyramid = TilePyramid(
+        cli.args.tiles,
+        cli.args.tile_overlap,
+        format,
+        cli.args.skip_uniform_tiles,
+        **pipeline.encoder.kwargs(format),
+    )
+    dest = os.path.splitext(get_output_file(file, cli.args))[0]
+    top = rendition.image
+    with file_stats.time("save") if file_stats else nullcontext():
+        descriptor = pyramid.write(top, dest)
+    cli.verbose(f"Wrote {pyramid.tiles} tiles, skipped {pyramid.skipped} uniform")
+    return [descriptor], file_stats
+
+
+def process_folder(cli: CLI) -> Batch:
+    file_iter = FileIterator(cli).filter_by_extension(IMAGE_EXTENSIONS)
+    batch = Batch(cli)
+    # Watch from before the walk, so that files landing during it are not missed
+    watcher = None
+    if cli.args.watch:
+        watcher = Watcher(file_iter, cli.args.watch_debounce, cli.args.watch_poll)
+    archive = archive_reader(file_iter, batch) if cli.archive_input else None
+    files = archive_files(archive) if archive else select_files(file_iter.walk(), batch)
+    files = batch.stats.timed(files) if batch.stats else files
+
+    completed = False
+    try:
+        if cli.args.io_threads or archive or batch.archive:
+            process_staged(files, batch, archive)
+        elif cli.args.jobs > 1 and file_iter.count(2) > 1:
+            # Forking the workers would take longer than a single file
+            process_parallel(files, batch)
+        else:
+            process_serial(files, batch)
+        if watcher:
+            watch_folder(watcher, batch)
+        completed = True
+    finally:
+        if watcher:
+            watcher.close()
+        if archive:
+            archive.close()
+        batch.close(completed)
+    return batch
+
+
+def select_files(files: Iterable[str], batch: Batch) -> Iterable[str]:
+    # The files of this shard that are left to process
+    cli = batch.cli
+    if cli.args.shard:
+        files = cli.args.shard.select(files, cli.args.input_folder)
+    if batch.journal:
+        files = batch.journal.pending(files)
+    if batch.manifest:
+        files = batch.manifest.changed(files)
+    return files
+
+
+def archive_reader(file_iter: FileIterator, batch: Batch) -> ArchiveReader:
+    # Members are selected as the files of a folder would be, by path, and
+    # before they are extracted, so that skipped members are never read
+    folder = batch.cli.args.input_folder
+
+    def selected(name: str) -> bool:
+        file = os.path.join(folder, name)
+        return file_iter.matches(file) and any(select_files([file], batch))
+
+    return ArchiveReader(folder, selected)
+
+
+def archive_files(archive: ArchiveReader) -> Generator[str, None, None]:
+    # Members are named by their path under the archive, as if it was a folder
+    for name in archive:
+        yield os.path.join(archive.path, name)
+
+
+def watch_folder(watcher: Watcher, batch: Batch) -> Batch:
+    # Process the files reported by the watcher until interrupted, with the
+    # process pool and Pillow kept loaded between them
+    cli = batch.cli
+    shard = cli.args.shard
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    polling = " (polling)" if watcher.polling else ""
+    cli.print(f"Watching for changes in: {cli.args.input_folder}{polling}")
+    executor = _process_pool(cli.args.jobs) if cli.args.jobs > 1 else None
+    try:
+        for changed, deleted in watcher.changes():
+            if shard:
+                changed = list(shard.select(changed, cli.args.input_folder))
+                deleted = list(shard.select(deleted, cli.args.input_folder))
+            if cli.args.mirror_deletes:
+                for file in deleted:
+                    for out_file in remove_outputs(file, cli):
+                        cli.print(f"{file} deleted --> {out_file}")
+            files = batch.manifest.changed(changed) if batch.manifest else changed
+            if executor:
+                process_parallel(files, batch, executor)
+            else:
+                process_serial(files, batch)
+            if batch.manifest:
+                batch.manifest.save()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return batch
+
+
+def remove_outputs(file: str, cli: CLI) -> list[str]:
+    # Delete the outputs of a source file, and return those that existed
+    removed = []
+    for output in cli.args.outputs:
+        out_file = get_output_file(file, cli.args, output)
+        if cli.args.tiles:
+            dest = os.path.splitext(out_file)[0]
+            shutil.rmtree(f"{dest}_files", ignore_errors=True)
+            out_file = f"{dest}.dzi"
+        if os.path.exists(out_file):
+            os.remove(out_file)
+            removed.append(out_file)
+    return removed
+
+
+def process_stream(cli: CLI, stdin: IO[bytes] = None, stdout: IO[bytes] = None):
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    pipeline = Pipeline.from_args(cli.args)
+    stdout.write(pipeline.process(stdin.read()))
+    stdout.flush()
+
+
+def process_serial(files: Iterable[str], batch: Batch) -> Batch:
+    for file in files:
+        try:
+            result = process_file(file, batch.cli)
+        except Exception as e:
+            batch.fail(file, e)
+            continue
+        batch.done(file, *result)
+    return batch
+
+
+def process_staged(
+    files: Iterable[str], batch: Batch, archive: ArchiveReader | None = None
+) -> Batch:
+    # Reader threads prefetch source files and writer threads write outputs
+    # while images are rendered, in a process pool when there are several jobs.
+    # An output archive is written by a single thread, as one sequential stream.
+    cli = batch.cli
+    args = cli.args
+    executor = _process_pool(args.jobs) if args.jobs > 1 else None
+    budget = None
+    if args.memory_limit:
+        budget = MemoryBudget(args.memory_limit * 1024 * 1024)
+
+    def render(file: str, read: tuple[bytes, FileStats | None]):
+        # With a memory limit, an image is only decoded once it fits the budget
+        size = budget.estimate(BytesIO(read[0])) if budget else 0
+        with budget.reserved(size) if budget else nullcontext():
+            if executor:
+                return executor.submit(render_file, file, *read, cli).result()
+            return render_file(file, *read, cli)
+
+    staged = StagedPipeline(
+        lambda file: read_file(file, cli, archive),
+        render,
+        lambda file, rendered: write_outputs(file, rendered, cli, batch.archive),
+        readers=args.io_threads or 1,
+        workers=args.jobs,
+        writers=1 if batch.archive else args.io_threads or 1,
+        read_ahead=args.read_ahead,
+        write_behind=args.write_behind,
+    )
+    try:
+        for file, result in staged.run(files):
+            if isinstance(result, Exception):
+                batch.fail(file, result)
+            else:
+                batch.done(file, *result)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return batch
+
+
+def process_parallel(
+    files: Iterable[str], batch: Batch, executor: Executor | None = None
+) -> Batch:
+    # Keep a bounded window of submitted files so that huge trees are not
+    # queued up in memory all at once. With a memory limit, files are only
+    # submitted once their estimated decoded size fits in the budget. A given
+    # executor is reused rather than shut down.
+    max_pending = batch.cli.args.jobs * 4
+    budget = None
+    if batch.cli.args.memory_limit:
+        budget = MemoryBudget(batch.cli.args.memory_limit * 1024 * 1024)
+    pool = nullcontext(executor) if executor else _process_pool(batch.cli.args.jobs)
+    with pool as executor:
+        pending = {}
+        for file in files:
+            if budget:
+                size = budget.estimate(file)
+                while not budget.fits(size):
+                    _collect_results(pending, batch, budget)
+            future = executor.submit(process_file, file, batch.cli)
+            pending[future] = file
+            if budget:
+                budget.acquire(future, size)
+            while len(pending) >= max_pending:
+                _collect_results(pending, batch, budget)
+        while pending:
+            _collect_results(pending, batch, budget)
+    return batch
+
+
+def _process_pool(jobs: int) -> Executor:
+    # multiprocessing is only imported for parallel runs, for a faster start-up
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    # Start the worker processes now, before the scan or stage threads, as
+    # forking a multi-threaded process can deadlock
+    executor.submit(int).result()
+    return executor
+
+
+def _collect_results(pending: dict, batch: Batch, budget: MemoryBudget | None = None):
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        file = pending.pop(future)
+        if budget:
+            budget.release(future)
+        try:
+            out_files, file_stats = future.result()
+        except Exception as e:
+            batch.fail(file, e)
+            continue
+        batch.done(file, out_files, file_stats)
+
+
+def get_output_file(file: str, args, output: OutputSpec | None = None) -> str:
     base_dir = args.output_folder
     if base_dir.endswith("/"):
         base_dir = base_dir[:-1]
+    new_file = f"{base_dir}/{get_output_name(file, args, output)}"
+
+    dir_name = os.path.dirname(new_file)
+    if not os.path.exists(dir_name):
+        os.makedirs(dir_name, exist_ok=True)
 
+    return new_file
+
+
+def get_output_name(file: str, args, output: OutputSpec | None = None) -> str:
+    # Path of the output file relative to the output folder
     if file.startswith(args.input_folder):
         file = file[len(args.input_folder) :]
         if file.startswith("/"):
             file = file[1:]
+    if output and output.name:
+        file = f"{output.name}/{file}"
 
-    file = f"{base_dir}/{file}"
     name, ext = os.path.splitext(file)
 
     # replace file extension with the new format
-    new_ext = args.format.value.lower()
+    new_ext = (output.format if output else args.format).value.lower()
     if new_ext == "jpeg":
         new_ext = "jpg"
 
-    new_file = f"{name}.{new_ext}" if len(ext) < 5 else f"{file}.{new_ext}"
-
-    dir_name = os.path.dirname(new_file)
-    if not os.path.exists(dir_name):
-        os.makedirs(dir_name)
-
-    return new_file
+    return f"{name}.{new_ext}" if len(ext) < 5 else f"{file}.{new_ext}"
 
 
 if __name__ == "__main__":
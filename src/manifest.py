@@ -0,0 +1,165 @@
+# Persistent build manifest kept in the output folder, used by the incremental
+# mode to skip source files whose content and processing parameters have not
+# changed since the last run.
+
+# Usage:
+# manifest = Manifest(output_folder, input_folder, params_from_args(args))
+# for file in manifest.changed(files):
+#     ...
+#     manifest.update(file, out_files)
+# manifest.save()
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Generator, Iterable
+
+from encoder import EncoderOptions
+
+MANIFEST_FILE = ".rexize-manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def params_from_args(args: argparse.Namespace) -> dict[str, Any]:
+    return {
+        "outputs": [str(output) for output in args.outputs],
+        "rgb": args.rgb,
+        "grayscale": args.grayscale,
+        "draft": args.draft,
+        "filter": args.filter.value if args.filter else None,
+        "reducing_gap": args.reducing_gap,
+        "encoder": EncoderOptions.from_args(args).to_dict(),
+        "passthrough": args.passthrough,
+    }
+
+
+def params_fingerprint(params: dict[str, Any]) -> str:
+    data = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def merge_manifests(paths: list[str], dest: str) -> None:
+    # Add the entries of the shard manifests of a run to the manifest at dest
+    files = {}
+    for path in [dest, *paths]:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            files.update(data.get("files", {}))
+    tmp_path = f"{dest}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f)
+    os.replace(tmp_path, dest)
+
+
+class Manifest:
+    def __init__(
+        self,
+        output_folder: str,
+        input_folder: str,
+        params: dict[str, Any],
+        use_hash: bool = False,
+        save_every: int = 1000,
+        file_name: str = MANIFEST_FILE,
+    ) -> None:
+        self._path = os.path.join(output_folder, file_name)
+        self._output_folder = output_folder
+        self._input_folder = input_folder
+        self._fingerprint = params_fingerprint(params)
+        self._use_hash = use_hash
+        self._save_every = save_every
+        self._entries: dict[str, dict] = {}
+        self._pending: dict[str, dict] = {}
+        self._unsaved = 0
+        self.skipped = 0
+        self.load()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> None:
+        if not os.path.exists(self._path):
+            return
+        with open(self._path) as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            self._entries = data.get("files", {})
+
+    def save(self) -> None:
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self._entries}, f)
+        os.replace(tmp_path, self._path)
+        self._unsaved = 0
+
+    def changed(self, files: Iterable[str]) -> Generator[str, None, None]:
+        for file in files:
+            try:
+                current = self.is_current(file)
+            except FileNotFoundError:
+                # Deleted or renamed since it was listed, e.g. by --watch
+                continue
+            if current:
+                self.skipped += 1
+            else:
+                yield file
+
+    def is_current(self, file: str) -> bool:
+        key = self._key(file)
+        stat = os.stat(file)
+        signature = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "params": self._fingerprint,
+        }
+        entry = self._entries.get(key)
+        current = (
+            entry is not None
+            and entry["params"] == signature["params"]
+            and entry["size"] == signature["size"]
+            and all(
+                os.path.exists(os.path.join(self._output_folder, out_file))
+                for out_file in entry.get("outputs", [])
+            )
+        )
+        if current and entry["mtime_ns"] != signature["mtime_ns"]:
+            # The file was touched: only trust it if the content hash matches
+            current = self._use_hash and entry.get("hash") == file_hash(file)
+            if current:
+                entry["mtime_ns"] = signature["mtime_ns"]
+                self._unsaved += 1
+
+        if not current:
+            if self._use_hash:
+                signature["hash"] = file_hash(file)
+            self._pending[key] = signature
+        return current
+
+    def update(self, file: str, out_files: list[str]) -> None:
+        key = self._key(file)
+        signature = self._pending.pop(key, None)
+        if signature is None:
+            return
+        # Outputs are relative to the output folder, so that the manifest
+        # still applies from another working directory or mount point
+        outputs = [os.path.relpath(out, self._output_folder) for out in out_files]
+        self._entries[key] = {**signature, "outputs": outputs}
+        self._unsaved += 1
+        if self._unsaved >= self._save_every:
+            self.save()
+
+    def _key(self, file: str) -> str:
+        return os.path.relpath(file, self._input_folder)
@@ -0,0 +1,70 @@
+# Limits how many images are decoded at the same time, based on their pixel
+# memory estimated from the image header.
+
+# Usage:
+# budget = MemoryBudget(1024 * 1024 * 1024)
+# size = budget.estimate(file)
+# if budget.fits(size):
+#     budget.acquire(job, size)
+#     ...
+#     budget.release(job)
+#
+# or, from several threads:
+# with budget.reserved(size):
+#     ...
+
+import threading
+from contextlib import contextmanager
+from typing import IO, Generator, Hashable
+
+from image_manipulator import ImageManipulator
+
+# Pillow stores multi-band pixels in 4 bytes, and a resize holds the source and
+# the resized image at the same time.
+BYTES_PER_PIXEL = 4
+IMAGES_PER_DECODE = 2
+
+
+class MemoryBudget:
+    def __init__(self, limit_bytes: int) -> None:
+        self._limit = limit_bytes
+        self._sizes: dict[Hashable, int] = {}
+        self._used = 0
+        self._condition = threading.Condition()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    @staticmethod
+    def estimate(file: str | IO[bytes]) -> int:
+        try:
+            width, height = ImageManipulator(file).size
+        except Exception:
+            return 0
+        return width * height * BYTES_PER_PIXEL * IMAGES_PER_DECODE
+
+    def fits(self, size: int) -> bool:
+        # An image over the whole budget still runs, but on its own
+        return self._used == 0 or self._used + size <= self._limit
+
+    def acquire(self, job: Hashable, size: int) -> None:
+        self._sizes[job] = size
+        self._used += size
+
+    def release(self, job: Hashable) -> None:
+        self._used -= self._sizes.pop(job, 0)
+
+    @contextmanager
+    def reserved(self, size: int) -> Generator[None, None, None]:
+        # Wait until size fits in the budget, and hold it until the end of the
+        # block. Thread-safe, unlike acquire() and release().
+        with self._condition:
+            self._condition.wait_for(lambda: self.fits(size))
+            self._used += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used -= size
+                self._condition.notify_all()
@@ -0,0 +1,240 @@
+# Library API to resize and convert images without going through the CLI.
+# A Pipeline is configured once and can then process any number of images,
+# given as paths, bytes or binary file objects.
+
+# Usage:
+# pipeline = Pipeline(max_size=800, format=ImageFormat.JPEG, mode="RGB")
+# data = pipeline.process(open("photo.png", "rb").read())
+# pipeline.process("photo.png", "photo.jpg")
+
+import argparse
+import hashlib
+import os
+from typing import IO, Any, Generator
+
+from cache import ResultCache
+from cli import CLI
+from encoder import EncoderOptions
+from image import ImageFormat, ImageSizeUnit, OutputSpec, ResampleFilter
+from image_manipulator import ImageManipulator
+from manifest import HASH_CHUNK_SIZE, file_hash
+from stats import FileStats
+
+Source = str | os.PathLike | bytes | bytearray | memoryview | IO[bytes]
+Destination = str | os.PathLike | IO[bytes]
+
+
+class Pipeline:
+    def __init__(
+        self,
+        width: ImageSizeUnit | int | str = 0,
+        height: ImageSizeUnit | int | str = 0,
+        max_size: ImageSizeUnit | int | str = 0,
+        format: ImageFormat | str = ImageFormat.WEBP,
+        mode: str | None = None,
+        draft: float = 0,
+        outputs: list[OutputSpec] | None = None,
+        cache: ResultCache | None = None,
+        low_memory: bool = False,
+        filter: ResampleFilter | str | None = None,
+        reducing_gap: float | None = None,
+        encoder: EncoderOptions | None = None,
+    ) -> None:
+        self._outputs = outputs or [OutputSpec("", width, height, max_size, format)]
+        self._mode = mode
+        self._draft = draft
+        try:
+            self._filter = (
+                ResampleFilter[filter.upper()] if isinstance(filter, str) else filter
+            )
+        except KeyError:
+            raise ValueError(f"Invalid resampling filter: {filter}")
+        self._reducing_gap = reducing_gap
+        self._encoder = encoder or EncoderOptions()
+        self._cache = cache
+        self._low_memory = low_memory
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "Pipeline":
+        mode = None
+        if args.grayscale:
+            mode = "L"
+        elif args.rgb:
+            mode = "RGB"
+        cache = None
+        if args.cache_dir:
+            cache = ResultCache.shared(args.cache_dir, args.cache_size * 1024 * 1024)
+        return cls(
+            mode=mode,
+            draft=args.draft,
+            outputs=args.outputs,
+            cache=cache,
+            low_memory=bool(args.memory_limit),
+            filter=args.filter,
+            reducing_gap=args.reducing_gap,
+            encoder=EncoderOptions.from_args(args),
+        )
+
+    @property
+    def outputs(self) -> list[OutputSpec]:
+        return self._outputs
+
+    @property
+    def mode(self) -> str | None:
+        return self._mode
+
+    @property
+    def draft(self) -> float:
+        return self._draft
+
+    @property
+    def filter(self) -> ResampleFilter | None:
+        return self._filter
+
+    @property
+    def reducing_gap(self) -> float | None:
+        return self._reducing_gap
+
+    @property
+    def encoder(self) -> EncoderOptions:
+        return self._encoder
+
+    @property
+    def params(self) -> dict[str, Any]:
+        return {
+            "outputs": [str(output) for output in self.outputs],
+            "mode": self.mode,
+            "draft": self.draft,
+            "filter": self.filter.value if self.filter else None,
+            "reducing_gap": self.reducing_gap,
+            "encoder": self.encoder.to_dict(),
+        }
+
+    def output_params(self, output: OutputSpec) -> dict[str, Any]:
+        # Everything that affects the encoded image of one output, but not its
+        # name, used as cache key
+        params = {key: value for key, value in self.params.items() if key != "outputs"}
+        return {
+            **params,
+            "width": str(output.width),
+            "height": str(output.height),
+            "max_size": str(output.max_size),
+            "format": output.format.value,
+        }
+
+    def open(
+        self,
+        source: Source,
+        cli: CLI | None = None,
+        stats: FileStats | None = None,
+    ) -> ImageManipulator:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return ImageManipulator.from_bytes(source, cli, stats)
+        return ImageManipulator(source, cli, stats)
+
+    def render(
+        self,
+        source: Source | ImageManipulator,
+        outputs: list[OutputSpec] | None = None,
+    ) -> Generator[tuple[OutputSpec, ImageManipulator], None, None]:
+        # Decode the source once and yield every output rendition of it. In low
+        # memory mode, each rendition is only valid until the next is yielded.
+        image = source if isinstance(source, ImageManipulator) else self.open(source)
+        outputs = self.outputs if outputs is None else outputs
+        yield from image.renditions(
+            outputs,
+            draft=self.draft,
+            mode=self.mode,
+            release=self._low_memory,
+            filter=self.filter,
+            reducing_gap=self.reducing_gap,
+        )
+
+    def process(
+        self, source: Source, dest: Destination | None = None
+    ) -> bytes | Destination:
+        # Process a single-output pipeline: the encoded image is written to
+        # dest when given, and returned as bytes otherwise.
+        if len(self.outputs) != 1:
+            raise ValueError("Use process_all() for pipelines with several outputs")
+        results = self.process_all(source, {self.outputs[0].name: dest})
+        return results[self.outputs[0].name]
+
+    def process_all(
+        self,
+        source: Source | ImageManipulator,
+        dests: dict[str, Destination | None] | None = None,
+        outputs: list[OutputSpec] | None = None,
+    ) -> dict[str, bytes | Destination]:
+        # Process every output, keyed by output name. Outputs without an entry
+        # in dests are returned as bytes.
+        dests = dests or {}
+        outputs = self.outputs if outputs is None else outputs
+        results, keys = self._from_cache(source, dests, outputs)
+        outputs = [output for output in outputs if output.name not in results]
+
+        for output, rendition in self.render(source, outputs):
+            dest = dests.get(output.name)
+            options = self.encoder.kwargs(output.format)
+            target_bytes = self.encoder.target(output.format)
+            if dest is None:
+                results[output.name] = rendition.to_bytes(
+                    output.format, target_bytes, **options
+                )
+            else:
+                rendition.save(dest, output.format, target_bytes, **options)
+                results[output.name] = dest
+
+            result = results[output.name]
+            if output.name in keys and isinstance(result, (bytes, str)):
+                self._cache.put(keys[output.name], result)
+        return results
+
+    def _from_cache(
+        self,
+        source: Source | ImageManipulator,
+        dests: dict[str, Destination | None],
+        outputs: list[OutputSpec],
+    ) -> tuple[dict[str, bytes | Destination], dict[str, str]]:
+        # Serve outputs from the cache, returning the results of the hits and
+        # the cache keys of the misses
+        results = {}
+        keys = {}
+        digest = self._source_digest(source) if self._cache else None
+        if not digest:
+            return results, keys
+
+        for output in outputs:
+            key = ResultCache.key(digest, self.output_params(output))
+            dest = dests.get(output.name)
+            if dest is None or isinstance(dest, (str, os.PathLike)):
+                result = self._cache.get(key, dest)
+            elif data := self._cache.get(key):
+                dest.write(data)
+                result = dest
+            else:
+                result = None
+
+            if result is None:
+                keys[output.name] = key
+            else:
+                results[output.name] = result
+        return results, keys
+
+    @staticmethod
+    def _source_digest(source: Source | ImageManipulator) -> str | None:
+        if isinstance(source, ImageManipulator):
+            source = source.source
+        if isinstance(source, (str, os.PathLike)):
+            return file_hash(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(source).hexdigest()
+        if not source.seekable():
+            return None
+
+        digest = hashlib.sha256()
+        position = source.tell()
+        while chunk := source.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        source.seek(position)
+        return digest.hexdigest()
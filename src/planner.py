@@ -0,0 +1,142 @@
+# Plans the operations collected by an ImageManipulator: they only run once the
+# pixels are needed, reordered so that the expensive ones process fewer pixels
+# or bands, and with redundant operations merged or dropped.
+
+# Usage:
+# plan = plan_operations(
+#     [("resize", ((100, 80), 0)), ("convert", ("L",))], size=(440, 578), mode="RGB"
+# )
+# [("convert", ("L",)), ("resize", ((100, 80), 0))]
+
+from typing import Any
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+RESIZE = "resize"
+CONVERT = "convert"
+ROTATE = "rotate"
+
+# Converting along these modes only drops bands, so a chain of conversions
+# gives the same pixels as converting straight to the last mode
+DROPPING_MODES = ["RGBA", "RGB", "L"]
+
+Operation = tuple[str, tuple[Any, ...]]
+
+
+def plan_operations(
+    operations: list[Operation], size: tuple[int, int], mode: str
+) -> list[Operation]:
+    # size and mode are those of the source image
+    planned: list[Operation] = []
+    for operation in operations:
+        index = len(planned)
+        while index and _runs_first(
+            operation, planned[index - 1], *_state_at(planned, index - 1, size, mode)
+        ):
+            index -= 1
+        planned.insert(index, operation)
+        while _simplify(planned, size, mode):
+            pass
+    return planned
+
+
+def is_cheaper_to_convert_first(src_mode: str, mode: str) -> bool:
+    # Resampling is linear, so converting to a mode with fewer bands before
+    # resizing gives the same result for less work, unless an alpha band
+    # would be dropped: resizing premultiplies the colours by alpha.
+    return (
+        mode != src_mode
+        and "A" not in src_mode
+        and Image.getmodebands(mode) < Image.getmodebands(src_mode)
+    )
+
+
+def _runs_first(
+    operation: Operation, previous: Operation, size: tuple[int, int], mode: str
+) -> bool:
+    # Whether operation can run before previous with the same result, and is
+    # cheaper that way. size and mode are the state before previous runs.
+    name, args = operation
+    previous_name, previous_args = previous
+    if name == CONVERT and previous_name == RESIZE:
+        return is_cheaper_to_convert_first(mode, args[0])
+    if name == CONVERT and previous_name == ROTATE:
+        # Rotating only moves pixels and fills the corners with black, so it
+        # commutes with conversions between these modes
+        return _drops_bands(mode, args[0])
+    if name == ROTATE and previous_name == CONVERT:
+        return _drops_bands(previous_args[0], mode)
+    if name == RESIZE and previous_name == ROTATE:
+        # Half turns commute with resizing, and are cheaper on fewer pixels
+        new_size = args[0]
+        return previous_args[0] % 180 == 0 and (
+            new_size[0] * new_size[1] < size[0] * size[1]
+        )
+    return False
+
+
+def _simplify(planned: list[Operation], size: tuple[int, int], mode: str) -> bool:
+    # Apply the first simplification found, and return whether there was one
+    previous = None
+    for index, (name, args) in enumerate(planned):
+        if _is_noop(name, args, size, mode):
+            del planned[index]
+            return True
+        merged = _merge(previous, (name, args)) if previous else None
+        if merged:
+            planned[index - 1 : index + 1] = [merged]
+            return True
+        if name == RESIZE:
+            size = args[0]
+        elif name == CONVERT:
+            mode = args[0]
+        previous = (name, args)
+    return False
+
+
+def _is_noop(name: str, args: tuple, size: tuple[int, int], mode: str) -> bool:
+    if name == RESIZE:
+        return args[0] == size
+    if name == CONVERT:
+        return args[0] == mode
+    return name == ROTATE and args[0] % 360 == 0
+
+
+def _merge(previous: Operation, operation: Operation) -> Operation | None:
+    name, args = operation
+    if name != previous[0]:
+        return None
+    if name == RESIZE:
+        # A single resample from the larger image is both faster and sharper.
+        # Keep the draft of either resize, the decoder can only apply one.
+        return RESIZE, (args[0], args[1] or previous[1][1], *args[2:])
+    if name == CONVERT:
+        if previous[1][0] == args[0] or _drops_bands(previous[1][0], args[0]):
+            return operation
+        return None
+    if name == ROTATE and args[0] % 180 == 0 and previous[1][0] % 180 == 0:
+        # Rotations crop the corners, so only half turns add up exactly
+        return ROTATE, ((previous[1][0] + args[0]) % 360,)
+    return None
+
+
+def _drops_bands(mode: str, new_mode: str) -> bool:
+    return (
+        mode in DROPPING_MODES
+        and new_mode in DROPPING_MODES
+        and Image.getmodebands(new_mode) < Image.getmodebands(mode)
+    )
+
+
+def _state_at(
+    planned: list[Operation], index: int, size: tuple[int, int], mode: str
+) -> tuple[tuple[int, int], str]:
+    # Size and mode of the image before planned[index] runs
+    for name, args in planned[:index]:
+        if name == RESIZE:
+            size = args[0]
+        elif name == CONVERT:
+            mode = args[0]
+    return size, mode
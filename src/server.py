@@ -0,0 +1,301 @@
+# Minimal asyncio HTTP service resizing images with the same options as the CLI.
+# The CPU work runs in a bounded process pool; requests beyond the number of
+# pending slots are rejected with 503 and each request has a timeout.
+
+# Usage:
+# rexize serve --port 8080
+# curl --data-binary @photo.png "http://localhost:8080/resize?width=50%&format=JPEG"
+
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+from cache import ResultCache
+from encoder import EncoderOptions
+from image import ImageFormat
+from pipeline import Pipeline
+
+MAX_HEADER_LINES = 100
+RESIZE_PARAMS = {
+    "width",
+    "height",
+    "max_size",
+    "format",
+    "mode",
+    "draft",
+    "filter",
+    "reducing_gap",
+}
+ENCODER_PARAMS = {"quality", "method", "lossless", "target_bytes"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str | None = None) -> None:
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+def render(
+    data: bytes, params: dict[str, Any], cache: tuple[str, int] | None = None
+) -> bytes:
+    # Runs in a worker process
+    cache = ResultCache.shared(*cache) if cache else None
+    return Pipeline(**params, cache=cache).process(data)
+
+
+class ResizeServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        workers: int | None = None,
+        max_pending: int | None = None,
+        timeout: float = 30,
+        max_body: int = 50 * 1024 * 1024,
+        executor: Executor | None = None,
+        cache: tuple[str, int] | None = None,
+    ) -> None:
+        # cache is the directory and maximum size in bytes of a ResultCache
+        self._host = host
+        self._port = port
+        self._workers = workers or os.cpu_count() or 1
+        self._max_pending = self._workers * 4 if max_pending is None else max_pending
+        self._timeout = timeout
+        self._max_body = max_body
+        self._executor = executor
+        self._own_executor = executor is None
+        self._cache = cache
+        self._pending = 0
+        self._server: asyncio.Server | None = None
+
+    @property
+    def port(self) -> int:
+        # The bound port, useful when started on port 0
+        if self._server and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+
+    async def serve_forever(self) -> None:
+        if not self._server:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._own_executor and self._executor:
+            self._executor.shutdown(cancel_futures=True)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            content_type, body = await self._dispatch(reader)
+            await self._respond(writer, HTTPStatus.OK, body, content_type)
+        except HTTPError as e:
+            await self._respond(writer, e.status, f"{e}\n".encode())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            await self._respond(
+                writer, HTTPStatus.INTERNAL_SERVER_ERROR, f"{e}\n".encode()
+            )
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader) -> tuple[str, bytes]:
+        method, target, headers = await self._read_head(reader)
+        url = urlsplit(target)
+        if url.path == "/health":
+            return "text/plain", b"ok\n"
+        if url.path != "/resize":
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        if method != "POST":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+
+        params = self._parse_params(url.query)
+        body = await self._read_body(reader, headers)
+        if self._pending >= self._max_pending:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, retry later")
+
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(render, body, params, self._cache)
+        # The slot is only freed once the job is done: a timed out request only
+        # cancels the job if it has not started, and a running one still loads
+        # the pool
+        self._pending += 1
+        job.add_done_callback(lambda _: self._job_done(loop))
+        try:
+            data = await asyncio.wait_for(asyncio.wrap_future(job), self._timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, "Request timed out")
+        except (ValueError, OSError) as e:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        return f"image/{params['format'].lower()}", data
+
+    def _job_done(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called from a thread of the executor
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # The loop is closed
+
+    def _release(self) -> None:
+        self._pending -= 1
+
+    async def _read_head(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, dict[str, str]]:
+        request_line = await asyncio.wait_for(reader.readline(), self._timeout)
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST)
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), self._timeout)
+            if line in (b"\r\n", b"\n", b""):
+                return method.upper(), target, headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    async def _read_body(
+        self, reader: asyncio.StreamReader, headers: dict[str, str]
+    ) -> bytes:
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        if length > self._max_body:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        return await asyncio.wait_for(reader.readexactly(length), self._timeout)
+
+    @staticmethod
+    def _parse_params(query: str) -> dict[str, Any]:
+        params = dict(parse_qsl(query))
+        unknown = set(params) - RESIZE_PARAMS - ENCODER_PARAMS
+        if unknown:
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST, f"Unknown parameters: {sorted(unknown)}"
+            )
+        params.setdefault("format", ImageFormat.WEBP.value)
+        try:
+            for key in ["draft", "reducing_gap"]:
+                if key in params:
+                    params[key] = float(params[key])
+            encoder = {key: params.pop(key) for key in ENCODER_PARAMS & set(params)}
+            lossless = encoder.pop("lossless", "").lower() in ("1", "true")
+            params["encoder"] = EncoderOptions(
+                lossless=lossless,
+                **{key: int(value) for key, value in encoder.items()},
+            )
+            # Validate early, in the event loop, so bad requests never reach
+            # the process pool
+            pipeline = Pipeline(**params)
+        except (ValueError, TypeError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        params["format"] = pipeline.outputs[0].format.value
+        return params
+
+    @staticmethod
+    async def _respond(
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: bytes,
+        content_type: str = "text/plain",
+    ) -> None:
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def serve_main(cli_args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="rexize serve", description="Serve image resizing over HTTP."
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8080, help="Bind port")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes. Defaults to the CPU count",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Maximum number of requests being processed before rejecting "
+        "new ones with 503. Defaults to 4 per worker",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="Request timeout in seconds"
+    )
+    parser.add_argument(
+        "--max-body",
+        type=int,
+        default=50,
+        help="Maximum request body size in MB",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Folder of a cache of processed images, shared with batch runs",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        metavar="MB",
+        help="Maximum size of the cache in MB",
+    )
+    args = parser.parse_args(cli_args)
+
+    server = ResizeServer(
+        args.host,
+        args.port,
+        workers=args.jobs,
+        max_pending=args.max_pending,
+        timeout=args.timeout,
+        max_body=args.max_body * 1024 * 1024,
+        cache=(
+            (args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None
+        ),
+    )
+
+    async def run():
+        await server.start()
+        print(f"Serving on http://{args.host}:{server.port}", file=sys.stderr)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,148 @@
+# Splits a run across machines sharing the input and output folders, without
+# any coordination: every file belongs to exactly one shard, chosen by a stable
+# hash of its path relative to the input folder. Each shard keeps its own
+# journal and manifest, which `rexize merge` combines once all shards are done.
+
+# Usage:
+# rexize ~/images ~/resized -W 50% --shard 1/4   # on node 1
+# rexize ~/images ~/resized -W 50% --shard 4/4   # on node 4
+# rexize merge ~/resized --stats node*.json
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Generator, Iterable, Self
+
+from journal import JOURNAL_FILE, merge_journals
+from manifest import MANIFEST_FILE, merge_manifests
+from stats import format_report, merge_summaries
+
+
+class Shard:
+    def __init__(self, index: int, count: int) -> None:
+        # index is 1-based, from 1 to count
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, value: str) -> Self:
+        match = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+        if not match:
+            raise ValueError(f"Invalid shard, expected INDEX/COUNT: {value}")
+        return cls(int(match[1]), int(match[2]))
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def owns(self, rel_path: str) -> bool:
+        # The same on every machine and Python process, unlike hash()
+        key = rel_path.replace(os.sep, "/").encode()
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.count == self.index - 1
+
+    def select(
+        self, files: Iterable[str], input_folder: str
+    ) -> Generator[str, None, None]:
+        for file in files:
+            if self.owns(os.path.relpath(file, input_folder)):
+                yield file
+
+    def file_name(self, name: str) -> str:
+        # .rexize-manifest.json -> .rexize-manifest.2-of-4.json
+        root, ext = os.path.splitext(name)
+        return f"{root}.{self.index}-of-{self.count}{ext}"
+
+
+def shard_files(folder: str, name: str) -> tuple[dict[int, str], int]:
+    # The shard files of name in folder keyed by shard index, and the number of
+    # shards of the run
+    root, ext = os.path.splitext(name)
+    pattern = re.compile(rf"{re.escape(root)}\.(\d+)-of-(\d+){re.escape(ext)}")
+    files = {}
+    counts = set()
+    for entry in sorted(os.listdir(folder)):
+        if match := pattern.fullmatch(entry):
+            files[int(match[1])] = os.path.join(folder, entry)
+            counts.add(int(match[2]))
+    if len(counts) > 1:
+        raise ValueError(f"Shard files of different shard counts in {folder}")
+    return files, counts.pop() if counts else 0
+
+
+def merge_main(cli_args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="rexize merge",
+        description="Merge the journals, manifests and stats reports of the shards "
+        "of a run.",
+    )
+    parser.add_argument("output_folder", type=str, help="Output folder of the run")
+    parser.add_argument(
+        "--stats",
+        type=str,
+        nargs="+",
+        default=[],
+        metavar="FILE",
+        help="JSON stats reports of the shards, written with --stats FILE",
+    )
+    parser.add_argument(
+        "--stats-output",
+        type=str,
+        metavar="FILE",
+        help="Write the merged stats report as JSON instead of printing it",
+    )
+    parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="Remove the shard journals and manifests once merged",
+    )
+    args = parser.parse_args(cli_args)
+
+    status = merge_shard_files(args.output_folder, args.remove)
+    if args.stats:
+        merge_stats(args.stats, args.stats_output)
+    return status
+
+
+def merge_shard_files(folder: str, remove: bool = False) -> int:
+    # Merge the shard journals and manifests into those of an unsharded run, so
+    # that later runs can --resume or be --incremental over the whole folder
+    status = 0
+    for name, merge in [
+        (JOURNAL_FILE, merge_journals),
+        (MANIFEST_FILE, merge_manifests),
+    ]:
+        files, count = shard_files(folder, name)
+        if not files:
+            continue
+        missing = [str(index) for index in range(1, count + 1) if index not in files]
+        if missing:
+            print(f"Missing shards of {name}: {', '.join(missing)} of {count}")
+            status = 1
+        try:
+            merge(list(files.values()), os.path.join(folder, name))
+        except ValueError as e:
+            print(f"Not merging {name}: {e}")
+            status = 1
+            continue
+        print(f"Merged {len(files)} shards into {name}")
+        if remove:
+            for path in files.values():
+                os.remove(path)
+    return status
+
+
+def merge_stats(paths: list[str], output: str | None = None) -> None:
+    summaries = []
+    for path in paths:
+        with open(path) as f:
+            summaries.append(json.load(f))
+    summary = merge_summaries(summaries)
+    if output:
+        with open(output, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        print(format_report(summary))
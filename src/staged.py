@@ -0,0 +1,135 @@
+# Staged pipeline overlapping I/O with CPU work: reader threads prefetch
+# ahead of the workers, and writer threads flush results behind them. The
+# stages are joined by bounded queues, so memory stays bounded however far
+# one stage gets ahead of the next.
+
+# Usage:
+# staged = StagedPipeline(read, process, write, readers=8, writers=8)
+# for item, result in staged.run(files):
+#     if isinstance(result, Exception):
+#         ...
+#
+# A KeyboardInterrupt or SystemExit raised in a stage is raised again by run.
+
+import threading
+from queue import Queue
+from typing import Any, Callable, Generator, Iterable
+
+_STOP = object()
+
+
+class _Stage:
+    # A pool of threads applying work to the items of inbox. The last thread
+    # to finish stops the next stage.
+    def __init__(
+        self,
+        threads: int,
+        work: Callable[[Any, Any], Any],
+        inbox: Queue,
+        outbox: Queue,
+        errors: Queue,
+        consumers: int,
+    ) -> None:
+        self._work = work
+        self._inbox = inbox
+        self._outbox = outbox
+        self._errors = errors
+        self._consumers = consumers
+        self._running = threads
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True) for _ in range(threads)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self) -> None:
+        try:
+            while (entry := self._inbox.get()) is not _STOP:
+                item, value = entry
+                try:
+                    self._outbox.put((item, self._work(item, value)))
+                except Exception as e:
+                    self._errors.put((item, e))
+                except BaseException as e:
+                    # e.g. KeyboardInterrupt or SystemExit: hand it to run to
+                    # raise, and stop this thread
+                    self._errors.put((item, e))
+                    raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                for _ in range(self._consumers):
+                    self._outbox.put(_STOP)
+
+
+class StagedPipeline:
+    def __init__(
+        self,
+        read: Callable[[Any], Any],
+        process: Callable[[Any, Any], Any],
+        write: Callable[[Any, Any], Any],
+        readers: int = 4,
+        workers: int = 1,
+        writers: int = 4,
+        read_ahead: int = 16,
+        write_behind: int = 16,
+    ) -> None:
+        # read(item), process(item, read value) and write(item, processed
+        # value) each run in their own pool of threads
+        self._read = read
+        self._process = process
+        self._write = write
+        self._threads = (readers, workers, writers)
+        self._read_ahead = read_ahead
+        self._write_behind = write_behind
+
+    def run(self, items: Iterable[Any]) -> Generator[tuple[Any, Any], None, None]:
+        # Yield (item, write result) or (item, exception) in completion order.
+        # Items are pulled from the iterable by a feeder thread, so that a slow
+        # walk of the source also overlaps with the other stages.
+        readers, workers, writers = self._threads
+        pending = Queue(self._read_ahead)
+        reads = Queue(self._read_ahead)
+        writes = Queue(self._write_behind)
+        results = Queue()
+        feed_error = []
+
+        stages = [
+            _Stage(
+                readers,
+                lambda item, _: self._read(item),
+                pending,
+                reads,
+                results,
+                workers,
+            ),
+            _Stage(workers, self._process, reads, writes, results, writers),
+            _Stage(writers, self._write, writes, results, results, 1),
+        ]
+        for stage in stages:
+            stage.start()
+
+        def feed():
+            try:
+                for item in items:
+                    pending.put((item, None))
+            except BaseException as e:
+                feed_error.append(e)
+            finally:
+                for _ in range(readers):
+                    pending.put(_STOP)
+
+        threading.Thread(target=feed, daemon=True).start()
+        while (result := results.get()) is not _STOP:
+            if not isinstance(result[1], Exception) and isinstance(
+                result[1], BaseException
+            ):
+                raise result[1]
+            yield result
+        if feed_error:
+            raise feed_error[0]
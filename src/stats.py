@@ -0,0 +1,194 @@
+# Per-stage timing of the processing pipeline, collected per file and
+# summarised at the end of a run with totals, percentiles, bytes in and out,
+# and the slowest files.
+
+# Usage:
+# file_stats = FileStats(file)
+# with file_stats.time("resize"):
+#     ...
+# stats = Stats()
+# stats.add(file_stats)
+# print(stats.report())
+
+import heapq
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Generator, Iterable, TypeVar
+
+T = TypeVar("T")
+
+STAGES = ["walk", "read", "open", "decode", "resize", "convert", "save", "write"]
+PERCENTILES = [50, 90, 99]
+
+
+class FileStats:
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.timings: dict[str, float] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def seconds(self) -> float:
+        return sum(self.timings.values())
+
+    @contextmanager
+    def time(self, stage: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] = self.timings.get(stage, 0) + elapsed
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "file": self.file,
+            "seconds": self.seconds,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "timings": self.timings,
+        }
+
+
+class Stats:
+    def __init__(self, slowest: int = 10) -> None:
+        self._slowest_count = slowest
+        self._slowest: list[tuple[float, int, FileStats]] = []
+        self._timings: dict[str, list[float]] = {}
+        self._start = time.perf_counter()
+        self.walk_seconds = 0.0
+        self.files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, file_stats: FileStats) -> None:
+        self.files += 1
+        self.bytes_in += file_stats.bytes_in
+        self.bytes_out += file_stats.bytes_out
+        for stage, seconds in file_stats.timings.items():
+            self._timings.setdefault(stage, []).append(seconds)
+
+        # Keep a min-heap of the slowest files seen so far
+        item = (file_stats.seconds, self.files, file_stats)
+        if len(self._slowest) < self._slowest_count:
+            heapq.heappush(self._slowest, item)
+        elif self._slowest_count:
+            heapq.heappushpop(self._slowest, item)
+
+    def timed(self, iterable: Iterable[T]) -> Generator[T, None, None]:
+        # Time spent producing the items of a (lazy) iterable, i.e. walking
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.walk_seconds += time.perf_counter() - start
+            yield item
+
+    def summary(self) -> dict[str, Any]:
+        stages = {"walk": {"total": self.walk_seconds}}
+        for stage in sorted(self._timings, key=self._stage_order):
+            stages[stage] = self._stage_summary(self._timings[stage])
+        return {
+            "files": self.files,
+            "wall_seconds": time.perf_counter() - self._start,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "stages": stages,
+            "slowest": [
+                item[2].to_dict() for item in sorted(self._slowest, reverse=True)
+            ],
+            "slowest_count": self._slowest_count,
+        }
+
+    def report(self) -> str:
+        return format_report(self.summary())
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    @staticmethod
+    def _stage_summary(values: list[float]) -> dict[str, float]:
+        values = sorted(values)
+        summary = {
+            "count": len(values),
+            "total": sum(values),
+            "mean": sum(values) / len(values),
+        }
+        for pct in PERCENTILES:
+            # Nearest-rank percentile
+            index = max(0, -(-pct * len(values) // 100) - 1)
+            summary[f"p{pct}"] = values[index]
+        summary["max"] = values[-1]
+        return summary
+
+    @staticmethod
+    def _stage_order(stage: str) -> int:
+        return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def merge_summaries(summaries: list[dict[str, Any]]) -> dict[str, Any]:
+    # Combine the summaries of runs that ran side by side, such as the shards
+    # of a run: totals add up and the wall time is the longest run. Percentiles
+    # cannot be merged from summaries, so stages only keep their mean and max.
+    stages: dict[str, dict[str, float]] = {}
+    for summary in summaries:
+        for stage, values in summary["stages"].items():
+            merged = stages.setdefault(stage, {"count": 0, "total": 0.0})
+            merged["count"] += values.get("count", 0)
+            merged["total"] += values["total"]
+            if "max" in values:
+                merged["max"] = max(merged.get("max", 0.0), values["max"])
+    for values in stages.values():
+        if values["count"]:
+            values["mean"] = values["total"] / values["count"]
+        else:
+            del values["count"]
+
+    slowest = [item for summary in summaries for item in summary["slowest"]]
+    slowest.sort(key=lambda item: item["seconds"], reverse=True)
+    # Summaries without a count, written before it was recorded, keep as many
+    # files as they list
+    slowest_count = max(
+        (s.get("slowest_count", len(s["slowest"])) for s in summaries), default=0
+    )
+    return {
+        "files": sum(summary["files"] for summary in summaries),
+        "wall_seconds": max(
+            (summary["wall_seconds"] for summary in summaries), default=0.0
+        ),
+        "bytes_in": sum(summary["bytes_in"] for summary in summaries),
+        "bytes_out": sum(summary["bytes_out"] for summary in summaries),
+        "stages": dict(
+            sorted(stages.items(), key=lambda item: Stats._stage_order(item[0]))
+        ),
+        "slowest": slowest[:slowest_count],
+        "slowest_count": slowest_count,
+    }
+
+
+def format_report(summary: dict[str, Any]) -> str:
+    lines = [
+        f"Files: {summary['files']} in {summary['wall_seconds']:.2f}s",
+        f"Bytes in: {summary['bytes_in']}, out: {summary['bytes_out']}",
+        f"{'stage':<10}{'total':>10}{'mean':>10}"
+        + "".join(f"{f'p{pct}':>10}" for pct in PERCENTILES),
+    ]
+    for stage, values in summary["stages"].items():
+        lines.append(
+            f"{stage:<10}{values['total']:>10.3f}"
+            + "".join(
+                f"{values[key]:>10.4f}"
+                for key in ["mean"] + [f"p{pct}" for pct in PERCENTILES]
+                if key in values
+            )
+        )
+    lines.append("Slowest files:")
+    for item in summary["slowest"]:
+        lines.append(f"{item['seconds']:>10.3f}s  {item['file']}")
+    return "\n".join(lines)
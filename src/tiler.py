@@ -0,0 +1,132 @@
+# Deep Zoom (DZI) tile pyramids, for viewers such as OpenSeadragon that only
+# load the tiles of the region and zoom level on screen. The full resolution
+# level is cut into tiles first, then each lower level is reduced 2x from the
+# level above it, down to a single pixel, so the source is only resampled once.
+
+# Usage:
+# pyramid = TilePyramid(tile_size=254, overlap=1, format=ImageFormat.WEBP)
+# pyramid.write(image, "/tiles/scan")  # /tiles/scan.dzi and /tiles/scan_files/
+#
+# /tiles/scan_files/<level>/<column>_<row>.webp
+
+import importlib
+import math
+import os
+from typing import Any
+
+from file_utils import write_atomic
+from image import REDUCE_MODES, ImageFormat
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+DZI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="{namespace}" Format="{format}" Overlap="{overlap}" TileSize="{tile}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+class TilePyramid:
+    def __init__(
+        self,
+        tile_size: int = 254,
+        overlap: int = 1,
+        format: ImageFormat = ImageFormat.WEBP,
+        skip_uniform: bool = False,
+        **options: Any,
+    ) -> None:
+        # options are passed to the encoder of every tile. With skip_uniform,
+        # tiles of a single colour or fully transparent are not written, and
+        # the viewer upscales the same area from a lower level instead. Levels
+        # that fit in one tile are always complete, for it to fall back to.
+        if tile_size < 1 or overlap < 0:
+            raise ValueError("Tile size must be positive and overlap not negative")
+        self._tile_size = tile_size
+        self._overlap = overlap
+        self._format = format
+        self._skip_uniform = skip_uniform
+        self._options = options
+        self.tiles = 0
+        self.skipped = 0
+
+    @property
+    def extension(self) -> str:
+        ext = self._format.value.lower()
+        return "jpg" if ext == "jpeg" else ext
+
+    @staticmethod
+    def level_count(size: tuple[int, int]) -> int:
+        # Level 0 is 1x1 pixel, the last level is the full size
+        return math.ceil(math.log2(max(size))) + 1
+
+    def write(self, image: "Image.Image", dest: str) -> str:
+        # Write the tiles under dest_files/ and return the dest.dzi descriptor.
+        # Importing the plugin keeps Pillow from importing all of them.
+        importlib.import_module(self._format.plugin)
+        if self._format == ImageFormat.JPEG and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in REDUCE_MODES:
+            # Palette and bilevel images, whose pixels cannot be averaged
+            alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if alpha else "RGB")
+        size = image.size
+        levels = self.level_count(size)
+        for level in reversed(range(levels)):
+            if level < levels - 1:
+                # Reduce the level above rather than the source: a 2x box
+                # filter reads every pixel of it exactly once
+                image = image.reduce(2)
+            self._write_level(image, os.path.join(f"{dest}_files", str(level)))
+
+        descriptor = f"{dest}.dzi"
+        write_atomic(descriptor, self.descriptor(size).encode())
+        return descriptor
+
+    def descriptor(self, size: tuple[int, int]) -> str:
+        return DZI_TEMPLATE.format(
+            namespace=DZI_NAMESPACE,
+            format=self.extension,
+            overlap=self._overlap,
+            tile=self._tile_size,
+            width=size[0],
+            height=size[1],
+        )
+
+    def _write_level(self, image: "Image.Image", folder: str) -> None:
+        os.makedirs(folder, exist_ok=True)
+        columns = math.ceil(image.width / self._tile_size)
+        rows = math.ceil(image.height / self._tile_size)
+        skip_uniform = self._skip_uniform and columns * rows > 1
+        for column in range(columns):
+            for row in range(rows):
+                tile = image.crop(self._tile_box(column, row, image.size))
+                if skip_uniform and self._is_uniform(tile):
+                    self.skipped += 1
+                    continue
+                path = os.path.join(folder, f"{column}_{row}.{self.extension}")
+                write_atomic(
+                    path,
+                    lambda f: tile.save(f, format=self._format.value, **self._options),
+                )
+                self.tiles += 1
+
+    def _tile_box(
+        self, column: int, row: int, size: tuple[int, int]
+    ) -> tuple[int, int, int, int]:
+        # Tiles overlap their neighbours, but not the edges of the image
+        left = column * self._tile_size - (self._overlap if column else 0)
+        top = row * self._tile_size - (self._overlap if row else 0)
+        right = min((column + 1) * self._tile_size + self._overlap, size[0])
+        bottom = min((row + 1) * self._tile_size + self._overlap, size[1])
+        return left, top, right, bottom
+
+    @staticmethod
+    def _is_uniform(tile: "Image.Image") -> bool:
+        extrema = tile.getextrema()
+        if not isinstance(extrema[0], tuple):
+            extrema = (extrema,)
+        if "A" in tile.getbands() and extrema[tile.getbands().index("A")][1] == 0:
+            return True
+        return all(low == high for low, high in extrema)
@@ -0,0 +1,218 @@
+# Watches the input folder for new, modified and deleted images, so that a
+# long-running process can handle files as they land instead of walking the
+# whole tree again. Linux inotify is used through ctypes when available, and
+# the tree is polled otherwise, or on request (e.g. for network file systems
+# that do not report remote writes). Events are debounced: a file is only
+# reported once it has had no event for `debounce` seconds. With inotify, a
+# file still open for writing is held until it is closed, however slow the
+# writer.
+
+# Usage:
+# watcher = Watcher(FileIterator(cli).filter_by_extension(["jpg"]))
+# for changed, deleted in watcher.changes():
+#     ...
+# watcher.close()
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Generator
+
+from file_iterator import FileIterator
+
+CHANGED = "changed"
+WRITING = "writing"
+DELETED = "deleted"
+RESCAN = "rescan"
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+DEFAULT_POLL_INTERVAL = 1.0
+# Files created or written without being closed, e.g. hard links or writers
+# that hang, are reported after this many seconds without events
+WRITE_TIMEOUT = 30.0
+
+Event = tuple[str, str]
+
+
+class _Inotify:
+    # Watches every folder of a tree, including folders created later
+    def __init__(self, directory: str) -> None:
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._folders: dict[int, str] = {}
+        self.add_tree(directory)
+
+    def add_tree(self, directory: str) -> list[str]:
+        # Watch directory and its sub-folders, and return the files already in
+        # them, which may have been written before the watch was added
+        files = []
+        for path, _, names in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                continue
+            self._folders[wd] = path
+            files.extend(os.path.join(path, name) for name in names)
+        return files
+
+    def read(self, timeout: float) -> list[Event]:
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            events.extend(self._events(wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def _events(self, wd: int, mask: int, name: str) -> list[Event]:
+        if mask & IN_Q_OVERFLOW:
+            return [(RESCAN, "")]
+        if mask & IN_IGNORED:
+            self._folders.pop(wd, None)
+            return []
+        if wd not in self._folders:
+            return []
+        path = os.path.join(self._folders[wd], name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                return [(CHANGED, file) for file in self.add_tree(path)]
+            return []
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            return [(DELETED, path)]
+        if mask & (IN_CREATE | IN_MODIFY):
+            # Held until IN_CLOSE_WRITE
+            return [(WRITING, path)]
+        return [(CHANGED, path)]
+
+
+class _Poller:
+    # Compares the size and modification time of the files at every interval
+    def __init__(self, files: FileIterator, interval: float) -> None:
+        self._files = files
+        self._interval = interval
+        self._next = 0.0
+        self._snapshot = self._scan()
+
+    def read(self, timeout: float) -> list[Event]:
+        time.sleep(max(0.0, min(timeout, self._next - time.monotonic())))
+        if time.monotonic() < self._next:
+            return []
+        snapshot = self._scan()
+        events = [
+            (CHANGED, file)
+            for file, signature in snapshot.items()
+            if self._snapshot.get(file) != signature
+        ]
+        events += [(DELETED, file) for file in self._snapshot if file not in snapshot]
+        self._snapshot = snapshot
+        return events
+
+    def close(self) -> None:
+        pass
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        self._next = time.monotonic() + self._interval
+        snapshot = {}
+        for file in self._files.walk():
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+
+class Watcher:
+    def __init__(
+        self,
+        files: FileIterator,
+        debounce: float = 0.25,
+        poll_interval: float = 0.0,
+    ) -> None:
+        # files selects the files to watch, as for a walk. With poll_interval,
+        # the tree is polled at that interval even where inotify is available.
+        self._files = files
+        self._debounce = debounce
+        self._backend = None
+        if not poll_interval:
+            try:
+                self._backend = _Inotify(files.directory)
+            except (OSError, AttributeError):
+                # No inotify: not Linux, or out of inotify instances
+                pass
+        if self._backend is None:
+            poll_interval = poll_interval or DEFAULT_POLL_INTERVAL
+            self._backend = _Poller(files, poll_interval)
+            # A file must look the same on two polls before it is reported
+            self._debounce = max(debounce, poll_interval)
+        # Pending events by file, with the time of the last one
+        self._pending: dict[str, tuple[str, float]] = {}
+
+    @property
+    def polling(self) -> bool:
+        return isinstance(self._backend, _Poller)
+
+    def changes(self) -> Generator[tuple[list[str], list[str]], None, None]:
+        # Yield the (changed, deleted) files whose last event is at least
+        # `debounce` seconds old. This never ends: stop iterating, then close().
+        while True:
+            timeout = self._debounce if self._pending else DEFAULT_POLL_INTERVAL
+            for kind, file in self._backend.read(timeout):
+                if kind == RESCAN:
+                    self._rescan()
+                elif self._files.matches(file):
+                    self._pending[file] = (kind, time.monotonic())
+
+            now = time.monotonic()
+            ready = [
+                file
+                for file, (kind, t) in self._pending.items()
+                if t <= now - (WRITE_TIMEOUT if kind == WRITING else self._debounce)
+            ]
+            if ready:
+                events = [(file, self._pending.pop(file)[0]) for file in ready]
+                yield (
+                    [file for file, kind in events if kind != DELETED],
+                    [file for file, kind in events if kind == DELETED],
+                )
+
+    def close(self) -> None:
+        self._backend.close()
+
+    def _rescan(self) -> None:
+        # Events were lost: every file may have changed
+        now = time.monotonic()
+        for file in self._files.walk():
+            self._pending[file] = (CHANGED, now)
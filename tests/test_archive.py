@@ -0,0 +1,146 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from uuid import uuid4
+
+import pytest
+from PIL import Image
+
+import main
+from archive import ArchiveReader, ArchiveWriter
+from cli import CLI
+from file_iterator import FileIterator
+from main import Batch, archive_files, archive_reader, process_folder
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_archive_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+@pytest.mark.parametrize("extension", [".zip", ".tar", ".tar.gz"])
+def test_archive_writer_reader(extension):
+    # Arrange
+    path = os.path.join(BASE_FOLDER, f"{uuid4()}{extension}")
+    writer = ArchiveWriter(path)
+
+    # Act
+    writer.add("a.txt", b"a")
+    writer.add("sub/b.png", b"b")
+    writer.close()
+    reader = ArchiveReader(path, lambda name: name.endswith(".png"))
+    members = {name: reader.read(name) for name in reader}
+    reader.close()
+
+    # Assert
+    assert writer.members == 2
+    assert members == {"sub/b.png": b"b"}
+    assert [name for name in os.listdir(BASE_FOLDER) if name.endswith(".tmp")] == []
+
+
+def test_archive_reader_skips_unsafe_members():
+    # Arrange
+    path = os.path.join(BASE_FOLDER, f"{uuid4()}.tar")
+    with tarfile.open(path, "w") as tar:
+        for name in ["./ok.png", "../up.png", "/abs.png"]:
+            info = tarfile.TarInfo(name)
+            tar.addfile(info)
+
+    # Act
+    reader = ArchiveReader(path)
+
+    # Assert
+    assert list(reader) == ["ok.png"]
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_process_archive_to_archive(jobs):
+    # Arrange
+    input_archive = os.path.join(BASE_FOLDER, f"{uuid4()}.tar.gz")
+    output_archive = os.path.join(BASE_FOLDER, f"{uuid4()}.zip")
+    with tarfile.open(input_archive, "w:gz") as tar:
+        for name in ["img1.png", "sub/img2.png", "notes.txt"]:
+            tar.add(SOURCE_IMAGE, name)
+    cli = CLI([input_archive, output_archive, "-W", "50%", "-j", jobs, "-q"])
+
+    # Act
+    batch = process_folder(cli)
+
+    # Assert
+    assert batch.file_count == 2
+    assert batch.failed_count == 0
+    with zipfile.ZipFile(output_archive) as archive:
+        assert sorted(archive.namelist()) == ["img1.webp", "sub/img2.webp"]
+        with archive.open("sub/img2.webp") as f:
+            assert Image.open(f).size == (220, 289)
+
+
+@pytest.mark.parametrize("option", [["--resume"], ["--shard", "1/2"]])
+def test_archive_output_unsupported(option):
+    # Arrange
+    output_archive = os.path.join(BASE_FOLDER, f"{uuid4()}.zip")
+
+    # Act & Assert
+    with pytest.raises(ValueError):
+        CLI([BASE_FOLDER, output_archive, "-W", "50%", *option])
+
+
+def test_archive_reader_selects_before_reading():
+    # Arrange
+    input_archive = os.path.join(BASE_FOLDER, f"{uuid4()}.tar")
+    with tarfile.open(input_archive, "w") as tar:
+        for i in range(20):
+            tar.add(SOURCE_IMAGE, f"img{i}.png")
+    cli = CLI([input_archive, BASE_FOLDER, "-W", "50%", "--shard", "1/2", "-q"])
+    batch = Batch(cli)
+    reader = archive_reader(FileIterator(cli), batch)
+
+    # Act
+    files = list(archive_files(reader))
+    for file in files:
+        reader.read(os.path.relpath(file, input_archive))
+    batch.close()
+
+    # Assert: the members of the other shard were skipped without extracting them
+    assert 0 < len(files) < 20
+    assert all(cli.args.shard.owns(os.path.relpath(f, input_archive)) for f in files)
+    assert not reader._buffered
+
+
+def test_process_archive_interrupted(monkeypatch):
+    # Arrange: a complete archive from a previous run
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(input_folder)
+    for i in range(4):
+        shutil.copy(SOURCE_IMAGE, os.path.join(input_folder, f"img{i}.png"))
+    output_archive = os.path.join(BASE_FOLDER, f"{uuid4()}.zip")
+    process_folder(CLI([input_folder, output_archive, "-W", "50%", "-q"]))
+
+    def interrupted(files, batch, archive=None):
+        for file in list(files)[:2]:
+            batch.archive.add(os.path.basename(file), b"partial")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(main, "process_staged", interrupted)
+
+    # Act
+    with pytest.raises(KeyboardInterrupt):
+        process_folder(CLI([input_folder, output_archive, "-W", "50%", "-q"]))
+
+    # Assert: the previous archive is kept, and the partial one removed
+    with zipfile.ZipFile(output_archive) as archive:
+        assert len(archive.namelist()) == 4
+    assert not [name for name in os.listdir(BASE_FOLDER) if name.endswith(".tmp")]
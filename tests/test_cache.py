@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+from cache import ResultCache
+from image import ImageFormat
+from image_manipulator import ImageManipulator
+from pipeline import Pipeline
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_cache_test")
+
+
+@pytest.fixture
+def cache_dir():
+    # Setup
+    cache_dir = os.path.join(BASE_FOLDER, str(uuid4()))
+
+    yield cache_dir
+
+    # Teardown
+    shutil.rmtree(BASE_FOLDER)
+
+
+def test_cache_put_get(cache_dir):
+    # Arrange
+    cache = ResultCache(cache_dir, max_bytes=1024)
+    key = cache.key("digest", {"width": "100px"})
+    dest_path = os.path.join(cache_dir, "out.bin")
+
+    # Act & Assert
+    assert cache.get(key) is None
+    cache.put(key, b"data")
+    assert cache.get(key) == b"data"
+    assert cache.get(key, dest_path) == dest_path
+    assert open(dest_path, "rb").read() == b"data"
+    assert key != cache.key("digest", {"width": "200px"})
+
+
+def test_cache_evicts_least_recently_used(cache_dir):
+    # Arrange
+    cache = ResultCache(cache_dir, max_bytes=1000)
+
+    # Act
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, b"x" * 100)
+        os.utime(cache.path(key), (i, i))
+    cache.get("a")  # Refreshes "a", so "b" is the least recently used
+    cache.evict(target_bytes=250)
+
+    # Assert
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_pipeline_with_cache(cache_dir, monkeypatch):
+    # Arrange
+    cache = ResultCache(cache_dir, max_bytes=1024 * 1024)
+    pipeline = Pipeline(width=100, format=ImageFormat.PNG, cache=cache)
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+    result = pipeline.process(SOURCE_IMAGE)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cache hits must not be decoded")
+
+    monkeypatch.setattr(ImageManipulator, "resize", fail)
+
+    # Act & Assert: byte-identical sources are served from the cache
+    assert pipeline.process(data) == result
+    dest_path = os.path.join(cache_dir, "out.png")
+    assert pipeline.process(bytearray(data), dest_path) == dest_path
+    assert open(dest_path, "rb").read() == result
@@ -6,6 +6,7 @@ from uuid import uuid4
 import pytest
 
 from cli import CLI
+from image import ResampleFilter
 
 # Constants
 SOURCE_FOLDER = "tests/data/test_dir_tree"
@@ -92,3 +93,70 @@ def test_argparser_readonly_output_folder():
     with pytest.raises(PermissionError) as e:
         CLI(input)
     assert str(e.value) == f"Output folder not writable at {readonly_folder}"
+
+
+def test_argparser_outputs(output_folder):
+    input = [
+        SOURCE_FOLDER,
+        output_folder,
+        "-o",
+        "name=thumb,max=200,format=JPEG",
+        "--output",
+        "name=medium,width=50%",
+    ]
+
+    cli = CLI(input)
+    thumb, medium = cli.args.outputs
+    assert thumb.name == "thumb"
+    assert thumb.max_size.value == 200
+    assert thumb.format.value == "JPEG"
+    assert medium.name == "medium"
+    assert medium.width.is_percentage
+    assert medium.format.value == "WEBP"
+
+
+def test_argparser_outputs_with_main_output(output_folder):
+    input = [SOURCE_FOLDER, output_folder, "-M", "1024", "-o", "name=thumb,max=200"]
+
+    cli = CLI(input)
+    main, thumb = cli.args.outputs
+    assert main.name == ""
+    assert main.max_size.value == 1024
+    assert thumb.name == "thumb"
+    with pytest.raises(ValueError):
+        CLI([SOURCE_FOLDER, output_folder, "-f", "PNG", "-o", "name=thumb,max=200"])
+
+
+def test_argparser_default_output(output_folder):
+    input = [SOURCE_FOLDER, output_folder, "-W", "100", "-f", "PNG"]
+
+    cli = CLI(input)
+    assert len(cli.args.outputs) == 1
+    assert cli.args.outputs[0].name == ""
+    assert cli.args.outputs[0].width.value == 100
+    assert cli.args.outputs[0].format.value == "PNG"
+
+
+def test_argparser_invalid_outputs(output_folder):
+    with pytest.raises(ValueError):
+        CLI([SOURCE_FOLDER, output_folder, "-o", "name=thumb,size=200"])
+    with pytest.raises(ValueError):
+        CLI([SOURCE_FOLDER, output_folder, "-o", "name=thumb"])
+    with pytest.raises(ValueError) as e:
+        CLI([SOURCE_FOLDER, output_folder, "-o", "max=200", "-o", "max=100"])
+    assert str(e.value) == "Each output rendition requires a unique name"
+
+
+def test_argparser_quality_profile(output_folder):
+    input = [SOURCE_FOLDER, output_folder, "-W", "100", "--quality-profile", "fast"]
+
+    cli = CLI(input)
+    assert cli.args.filter == ResampleFilter.BILINEAR
+    assert cli.args.reducing_gap == 2.0
+
+    cli = CLI(input + ["--filter", "box", "--reducing-gap", "1.5"])
+    assert cli.args.filter == ResampleFilter.BOX
+    assert cli.args.reducing_gap == 1.5
+
+    with pytest.raises(ValueError):
+        CLI(input + ["--reducing-gap", "0.5"])
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+from cli import CLI
+from dataset import INDEX_FILE
+from main import Batch, process_serial
+
+numpy = pytest.importorskip("numpy")
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_dataset_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+def test_dataset_export():
+    # Arrange
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    output_folder = f"{input_folder}_out"
+    os.makedirs(input_folder)
+    files = [os.path.join(input_folder, f"img{i}.png") for i in range(5)]
+    for file in files:
+        shutil.copy(SOURCE_IMAGE, file)
+    cli = CLI([input_folder, output_folder, "-W", "32", "-H", "24", "--npy", "2", "-q"])
+
+    # Act
+    batch = process_serial(files, Batch(cli))
+    batch.close()
+
+    # Assert
+    with open(os.path.join(output_folder, INDEX_FILE)) as f:
+        index = json.load(f)
+    assert index["shards"] == ["shard-00000.npy", "shard-00001.npy", "shard-00002.npy"]
+    assert index["paths"] == [f"img{i}.png" for i in range(5)]
+    shard = numpy.load(os.path.join(output_folder, index["shards"][2]), mmap_mode="r")
+    assert shard.shape == (1, 24, 32, 3)
+    assert shard.dtype == numpy.uint8
+    assert shard.any()
+
+
+def test_dataset_requires_fixed_size():
+    with pytest.raises(ValueError):
+        CLI([BASE_FOLDER, BASE_FOLDER, "-W", "50%", "-H", "24", "--npy"])
+    with pytest.raises(ValueError):
+        CLI([BASE_FOLDER, BASE_FOLDER, "-M", "32", "--npy"])
@@ -0,0 +1,51 @@
+import pytest
+
+from encoder import EncoderOptions, fit_to_size
+from image import ImageFormat
+from image_manipulator import ImageManipulator
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+
+
+def test_encoder_options_kwargs():
+    # Arrange
+    encoder = EncoderOptions(quality=80, method=1, progressive=True, compress_level=9)
+
+    # Act
+    jpeg = encoder.kwargs(ImageFormat.JPEG)
+    webp = encoder.kwargs(ImageFormat.WEBP)
+    png = encoder.kwargs(ImageFormat.PNG)
+
+    # Assert
+    assert jpeg == {"quality": 80, "progressive": True}
+    assert webp == {"quality": 80, "method": 1}
+    assert png == {"compress_level": 9}
+    assert EncoderOptions().kwargs(ImageFormat.WEBP) == {}
+    with pytest.raises(ValueError):
+        EncoderOptions(method=7)
+
+
+def test_encoder_fit_to_size():
+    # Arrange
+    image = ImageManipulator(SOURCE_IMAGE).convert("RGB").image
+    full_size = len(fit_to_size(image, ImageFormat.JPEG, 10**9))
+
+    # Act
+    data = fit_to_size(image, ImageFormat.JPEG, full_size // 3)
+
+    # Assert
+    assert len(data) <= full_size // 3
+    assert len(fit_to_size(image, ImageFormat.JPEG, 1)) > 1
+
+
+def test_image_manipulator_save_target_bytes():
+    # Arrange
+    image = ImageManipulator(SOURCE_IMAGE).resize("50%", 0)
+
+    # Act
+    data = image.to_bytes(ImageFormat.WEBP, target_bytes=10000, method=0)
+
+    # Assert
+    assert data.startswith(b"RIFF")
+    assert len(data) <= 10000
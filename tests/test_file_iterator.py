@@ -24,3 +24,40 @@ def test_file_iterator_filter():
 def test_file_iterator_filter_invalid_directory():
     with pytest.raises(FileNotFoundError):
         FileIterator("tests/data/invalid_dir_tree")
+
+
+def test_file_iterator_serial_and_concurrent_match():
+    cli = CLI(["tests/data/test_dir_tree", "tests/data/test_dir_tree"])
+    serial = list(FileIterator(cli).workers(1).walk())
+    concurrent = list(FileIterator(cli).workers(4).walk())
+    assert len(serial) == 10
+    assert sorted(serial) == sorted(concurrent)
+
+
+def test_file_iterator_include_exclude():
+    cli = CLI(["tests/data/test_dir_tree", "tests/data/test_dir_tree"])
+    files = list(FileIterator(cli).include(["p1/*"]).exclude(["p12"]).walk())
+    assert sorted(files) == [
+        "tests/data/test_dir_tree/p1/file1.ext",
+        "tests/data/test_dir_tree/p1/p11/file11.ext1",
+        "tests/data/test_dir_tree/p1/p11/file11.ext2",
+    ]
+
+
+def test_file_iterator_max_depth():
+    cli = CLI(
+        ["tests/data/test_dir_tree", "tests/data/test_dir_tree", "--max-depth", "1"]
+    )
+    files = list(FileIterator(cli).walk())
+    assert sorted(files) == [
+        "tests/data/test_dir_tree/p1/file1.ext",
+        "tests/data/test_dir_tree/p2/file2.ext",
+    ]
+
+
+def test_file_iterator_stops_early():
+    cli = CLI(["tests/data/test_dir_tree", "tests/data/test_dir_tree"])
+    file_iter = FileIterator(cli, queue_size=1).workers(4)
+    walk = file_iter.walk()
+    assert next(walk).startswith("tests/data/test_dir_tree/")
+    walk.close()
@@ -1,12 +1,15 @@
 import os
 import shutil
 import tempfile
+from io import BytesIO
 from uuid import uuid4
 
 import pytest
+from PIL import Image
 
-from image import ImageFormat, ImageSizeUnit
+from image import ImageFormat, ImageSizeUnit, OutputSpec, ResampleFilter
 from image_manipulator import ImageManipulator
+from stats import FileStats
 
 # Constants
 SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
@@ -61,6 +64,20 @@ def test_image_manipulator_resize():
     assert image.height == height.value
 
 
+def test_image_manipulator_resize_with_filter():
+    # Arrange
+    fast = ImageManipulator(SOURCE_IMAGE)
+    best = ImageManipulator(SOURCE_IMAGE)
+
+    # Act
+    fast.resize(100, 0, filter=ResampleFilter.BOX, reducing_gap=1.0)
+    best.resize(100, 0, filter=ResampleFilter.LANCZOS)
+
+    # Assert
+    assert fast.size == best.size == (100, 131)
+    assert fast.image.tobytes() != best.image.tobytes()
+
+
 def test_image_manipulator_resize_with_aspect_ratio_on_width():
     # Arrange
     image = ImageManipulator(SOURCE_IMAGE)
@@ -129,6 +146,21 @@ def test_image_manipulator_save_with_format():
     assert os.path.exists(dest_path)
 
 
+def test_image_manipulator_save_failed():
+    # Arrange
+    image = ImageManipulator(SOURCE_IMAGE)
+    folder = os.path.join(OUTPUT_BASE_FOLDER, str(uuid4()))
+    os.makedirs(folder)
+    dest_path = os.path.join(folder, "out.jpg")
+
+    # Act
+    with pytest.raises(OSError):
+        image.save(dest_path, format=ImageFormat.JPEG, quality="bad")
+
+    # Assert
+    assert os.listdir(folder) == []
+
+
 def test_image_manipulator_invalid_source_image():
     # Arrange
     invalid_image_path = "tests/data/invalid_img.png"
@@ -147,3 +179,179 @@ def test_image_manipulator_invalid_resize():
         image.resize(100, [120, 120])
     with pytest.raises(ValueError):
         image.resize("invalid", 100)
+
+
+def test_image_manipulator_resize_with_draft():
+    # Arrange
+    src_path = os.path.join(OUTPUT_BASE_FOLDER, f"{uuid4()}.jpg")
+    ImageManipulator(SOURCE_IMAGE).resize("400%", "400%").downscale_to_rgb().save(
+        src_path, format=ImageFormat.JPEG
+    )
+    image = ImageManipulator(src_path)
+    draft_image = ImageManipulator(src_path)
+
+    # Act
+    draft_image._draft((110, 144), 1.0)
+    image.resize(110, 0, draft=1.0)
+
+    # Assert
+    assert draft_image.width < 1760 and draft_image.width >= 110
+    assert draft_image.height < 2312 and draft_image.height >= 144
+    assert image.size == (110, 144)
+
+
+@pytest.mark.parametrize("mode", ["P", "1"])
+def test_image_manipulator_resize_with_draft_unreducible(mode):
+    # Arrange: palette and bilevel images, which Image.reduce() rejects
+    src_path = os.path.join(OUTPUT_BASE_FOLDER, f"{uuid4()}.png")
+    Image.open(SOURCE_IMAGE).convert(mode).save(src_path)
+    image = ImageManipulator(src_path)
+
+    # Act
+    image.resize(100, 0, draft=1.0)
+
+    # Assert
+    assert image.size == (100, 131)
+    assert image.image.mode == mode
+
+
+def test_image_manipulator_planned_operations():
+    # Arrange
+    src_path = os.path.join(OUTPUT_BASE_FOLDER, f"{uuid4()}.jpg")
+    ImageManipulator(SOURCE_IMAGE).convert("RGB").save(
+        src_path, format=ImageFormat.JPEG
+    )
+    file_stats = FileStats(src_path)
+    image = ImageManipulator(src_path, stats=file_stats)
+
+    # Act
+    image.resize(0, 0, max_size=200).convert("RGB").rotate(180).convert("L")
+
+    # Assert
+    assert image.size == (152, 200)
+    assert image._plan  # Nothing runs until the pixels are needed
+    assert image.image.mode == "L"
+    assert image.size == (152, 200)
+    assert not image._plan
+    assert "convert" not in file_stats.timings  # Decoded straight to grayscale
+
+
+def test_image_manipulator_renditions():
+    # Arrange
+    image = ImageManipulator(SOURCE_IMAGE)
+    outputs = [
+        OutputSpec("small", max_size=100),
+        OutputSpec("large", width="50%"),
+        OutputSpec("medium", height=200),
+    ]
+
+    # Act
+    renditions = {output.name: img for output, img in image.renditions(outputs)}
+
+    # Assert
+    assert list(renditions) == ["large", "medium", "small"]
+    assert renditions["large"].size == (220, 289)
+    assert renditions["medium"].size == (152, 200)
+    assert renditions["small"].size == (76, 100)
+    assert image.size == (440, 578)
+
+
+def test_image_manipulator_renditions_low_memory():
+    # Arrange
+    rgb = ImageManipulator(SOURCE_IMAGE).convert("RGB").to_bytes(ImageFormat.PNG)
+    image = ImageManipulator.from_bytes(rgb)
+    outputs = [OutputSpec("small", max_size=100), OutputSpec("large", width="50%")]
+
+    # Act
+    modes = [
+        (output.name, img.image.mode, img.size)
+        for output, img in image.renditions(outputs, mode="L", release=True)
+    ]
+
+    # Assert
+    assert modes == [("large", "L", (220, 289)), ("small", "L", (76, 100))]
+    assert image.image.mode == "L"
+    with pytest.raises(ValueError):
+        image.image.load()
+
+
+def test_image_manipulator_renditions_low_memory_same_size():
+    # Arrange: renditions at the source size share its image
+    image = ImageManipulator(SOURCE_IMAGE)
+    outputs = [
+        OutputSpec("full", width="100%"),
+        OutputSpec("max", max_size=1000),
+        OutputSpec("small", max_size=100),
+    ]
+
+    # Act
+    sizes = {
+        output.name: rendition.to_bytes(ImageFormat.PNG) and rendition.size
+        for output, rendition in image.renditions(outputs, release=True)
+    }
+
+    # Assert
+    assert sizes == {"full": (440, 578), "max": (440, 578), "small": (76, 100)}
+
+
+def test_image_manipulator_is_unchanged_by():
+    # Arrange
+    image = ImageManipulator(SOURCE_IMAGE)
+
+    # Act & Assert
+    assert image.is_unchanged_by(OutputSpec(max_size=1000, format="PNG"))
+    assert image.is_unchanged_by(OutputSpec(width=440, format="PNG"), image.image.mode)
+    assert not image.is_unchanged_by(OutputSpec(max_size=1000, format="WEBP"))
+    assert not image.is_unchanged_by(OutputSpec(max_size=200, format="PNG"))
+    assert not image.is_unchanged_by(OutputSpec(max_size=1000, format="PNG"), "L")
+
+
+def test_image_manipulator_from_bytes_to_bytes():
+    # Arrange
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+
+    for buffer in [data, bytearray(data), memoryview(data)]:
+        # Act
+        image = ImageManipulator.from_bytes(buffer).resize(100, 0)
+        result = image.to_bytes(ImageFormat.PNG)
+
+        # Assert
+        assert image.size == (100, 131)
+        assert result.startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("format", [ImageFormat.GIF, ImageFormat.WEBP])
+def test_image_manipulator_renditions_animated(format):
+    # Arrange: a looping animation built from the test image
+    source = Image.open(SOURCE_IMAGE).convert("RGB")
+    frames = [source.rotate(angle) for angle in (0, 90, 180)]
+    animation = BytesIO()
+    frames[0].save(
+        animation,
+        format="GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=[100, 200, 300],
+        loop=2,
+    )
+    image = ImageManipulator.from_bytes(animation.getvalue())
+    outputs = [OutputSpec(width=220, format=format.value), OutputSpec(width=110)]
+
+    # Act
+    results = {
+        output.width.value: Image.open(BytesIO(rendition.to_bytes(format)))
+        for output, rendition in image.renditions(outputs, release=True)
+    }
+
+    # Assert: every frame is resized, with its duration and the loop count
+    for width, result in results.items():
+        assert result.size == (width, int(width / 440 * 578))
+        assert result.n_frames == 3
+        durations = []
+        for index in range(result.n_frames):
+            result.seek(index)
+            result.load()
+            durations.append(result.info["duration"])
+        assert durations == [100, 200, 300]
+        assert result.info["loop"] == 2
@@ -0,0 +1,261 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from io import BytesIO
+from uuid import uuid4
+
+import pytest
+
+import main
+from cli import CLI
+from file_iterator import FileIterator
+from main import (
+    Batch,
+    process_folder,
+    process_parallel,
+    process_serial,
+    process_staged,
+    process_stream,
+)
+from memory_budget import MemoryBudget
+from staged import StagedPipeline
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_main_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+@pytest.fixture
+def input_folder():
+    # Setup: a small tree of images plus one file that is not a valid image
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(os.path.join(input_folder, "sub"))
+    for name in ["img1.png", "img2.png", "sub/img3.png"]:
+        shutil.copy(SOURCE_IMAGE, os.path.join(input_folder, name))
+    with open(os.path.join(input_folder, "broken.png"), "w") as f:
+        f.write("not an image")
+
+    yield input_folder
+
+    # Teardown
+    shutil.rmtree(input_folder)
+
+
+def _files(folder: str) -> list[str]:
+    return [
+        os.path.join(root, file)
+        for root, _, files in os.walk(folder)
+        for file in files
+        if file.endswith(".png")
+    ]
+
+
+def test_process_parallel(input_folder):
+    output_folder = f"{input_folder}_out"
+    cli = CLI([input_folder, output_folder, "-W", "50%", "-j", "2", "-q"])
+
+    batch = process_parallel(_files(input_folder), Batch(cli))
+
+    assert batch.file_count == 3
+    assert batch.failed_count == 1
+    assert os.path.exists(os.path.join(output_folder, "img1.webp"))
+    assert os.path.exists(os.path.join(output_folder, "sub", "img3.webp"))
+
+
+def test_process_parallel_forks_before_scan(input_folder):
+    output_folder = f"{input_folder}_out"
+    cli = CLI([input_folder, output_folder, "-W", "50%", "-j", "2", "-q"])
+
+    # The workers are forked before the scan threads start
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", DeprecationWarning)
+        batch = process_parallel(FileIterator(cli).walk(), Batch(cli))
+
+    assert batch.file_count == 3
+    assert not [w for w in caught if "fork()" in str(w.message)]
+
+
+def test_process_folder_single_file_is_serial(monkeypatch):
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(input_folder)
+    shutil.copy(SOURCE_IMAGE, os.path.join(input_folder, "img.png"))
+    cli = CLI([input_folder, f"{input_folder}_out", "-W", "50%", "-j", "4", "-q"])
+
+    # No worker processes are started for a single file
+    monkeypatch.setattr(main, "_process_pool", None)
+    batch = process_folder(cli)
+
+    assert batch.file_count == 1
+    assert batch.failed_count == 0
+
+
+def test_process_parallel_memory_limit(input_folder):
+    output_folder = f"{input_folder}_out"
+    # Each test image needs about 2MB, so they are processed one at a time
+    args = ["-W", "50%", "-j", "2", "--memory-limit", "1", "-q"]
+    cli = CLI([input_folder, output_folder, *args])
+
+    batch = process_parallel(_files(input_folder), Batch(cli))
+
+    assert batch.file_count == 3
+    assert batch.failed_count == 1
+    assert os.path.exists(os.path.join(output_folder, "sub", "img3.webp"))
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_process_staged(input_folder, jobs):
+    output_folder = f"{input_folder}_out"
+    args = ["-W", "50%", "-j", jobs, "--io-threads", "2", "--read-ahead", "1", "-q"]
+    cli = CLI([input_folder, output_folder, *args, "--stats", os.devnull])
+
+    batch = process_staged(_files(input_folder), Batch(cli))
+
+    assert batch.file_count == 3
+    assert batch.failed_count == 1
+    assert os.path.exists(os.path.join(output_folder, "sub", "img3.webp"))
+    assert batch.stats.summary()["bytes_out"] > 0
+
+
+def test_process_staged_memory_limit(input_folder):
+    output_folder = f"{input_folder}_out"
+    args = ["-W", "50%", "-j", "2", "--io-threads", "2", "--memory-limit", "1", "-q"]
+    cli = CLI([input_folder, output_folder, *args])
+
+    batch = process_staged(_files(input_folder), Batch(cli))
+
+    assert batch.file_count == 3
+    assert batch.failed_count == 1
+    assert os.path.exists(os.path.join(output_folder, "sub", "img3.webp"))
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_staged_pipeline_stage_exit():
+    def process(item, value):
+        if item == 2:
+            raise SystemExit(1)
+        return item
+
+    staged = StagedPipeline(lambda item: item, process, lambda item, value: value)
+    threads = threading.active_count()
+    results = []
+
+    with pytest.raises(SystemExit):
+        for item, result in staged.run(range(5)):
+            results.append(item)
+
+    # Every stage thread still stops
+    deadline = time.monotonic() + 5
+    while threading.active_count() > threads and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == threads
+    assert 2 not in results
+
+
+def test_memory_budget_reserved():
+    budget = MemoryBudget(100)
+    events = []
+
+    def hold(name):
+        with budget.reserved(60):
+            events.append(f"start {name}")
+            time.sleep(0.05)
+            events.append(f"end {name}")
+
+    threads = [threading.Thread(target=hold, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The second image only starts once the first one is done
+    assert [event.split()[0] for event in events] == ["start", "end", "start", "end"]
+    assert budget.used == 0
+
+
+def test_process_serial(input_folder):
+    output_folder = f"{input_folder}_out"
+    cli = CLI([input_folder, output_folder, "-W", "50%", "-j", "1", "-q"])
+    files = [f for f in _files(input_folder) if not f.endswith("broken.png")]
+
+    batch = process_serial(files, Batch(cli))
+
+    assert batch.file_count == 3
+    assert batch.failed_count == 0
+    assert os.path.exists(os.path.join(output_folder, "sub", "img3.webp"))
+
+
+def test_process_serial_resume(input_folder):
+    output_folder = f"{input_folder}_out"
+    args = [input_folder, output_folder, "-W", "50%", "-j", "1", "-q"]
+    files = sorted(_files(input_folder))
+
+    # A failing file does not stop the run
+    batch = process_serial(files[:3], Batch(CLI(args)))
+    batch.close()
+    resumed = Batch(CLI(args + ["--resume"]))
+    process_serial(resumed.journal.pending(files), resumed)
+    resumed.close()
+
+    assert (batch.file_count, batch.failed_count) == (2, 1)
+    assert resumed.journal.skipped == 2
+    assert (resumed.file_count, resumed.failed_count) == (1, 1)
+    assert not [f for f in os.listdir(output_folder) if f.endswith(".tmp")]
+
+
+def test_process_serial_journal_records_once(input_folder):
+    output_folder = f"{input_folder}_out"
+    args = [input_folder, output_folder, "-W", "50%", "-j", "1", "-q"]
+    files = [f for f in _files(input_folder) if not f.endswith("broken.png")]
+
+    # As for files changed again and again under --watch
+    batch = Batch(CLI(args))
+    for _ in range(3):
+        process_serial(files, batch)
+    batch.close()
+
+    with open(batch.journal.path) as f:
+        assert len(f.readlines()) == 1 + len(files)
+
+
+def test_process_stream():
+    cli = CLI(["-", "-", "-W", "50", "-f", "PNG"])
+    stdout = BytesIO()
+
+    with open(SOURCE_IMAGE, "rb") as stdin:
+        process_stream(cli, stdin, stdout)
+
+    assert stdout.getvalue().startswith(b"\x89PNG")
+    with pytest.raises(ValueError):
+        CLI(["-", BASE_FOLDER, "-W", "50"])
+
+
+def test_import_is_lazy():
+    # Act: import main in a fresh interpreter
+    code = "import sys, main; print('PIL._imaging' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": "src"},
+        check=True,
+    )
+
+    # Assert: Pillow is only loaded when an image is opened
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+from manifest import Manifest
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_manifest_test")
+PARAMS = {"width": "50%", "format": "WEBP"}
+
+
+@pytest.fixture
+def folders():
+    # Setup
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    output_folder = f"{input_folder}_out"
+    os.makedirs(input_folder)
+    os.makedirs(output_folder)
+    shutil.copy(SOURCE_IMAGE, os.path.join(input_folder, "img.png"))
+
+    yield input_folder, output_folder
+
+    # Teardown
+    shutil.rmtree(BASE_FOLDER)
+
+
+def _run(input_folder, output_folder, params=PARAMS, use_hash=False) -> list[str]:
+    manifest = Manifest(output_folder, input_folder, params, use_hash=use_hash)
+    files = [os.path.join(input_folder, "img.png")]
+    changed = list(manifest.changed(files))
+    for file in changed:
+        out_file = os.path.join(output_folder, "img.webp")
+        open(out_file, "w").close()
+        manifest.update(file, [out_file])
+    manifest.save()
+    return changed
+
+
+def test_manifest_skips_unchanged_files(folders):
+    assert len(_run(*folders)) == 1
+    assert len(_run(*folders)) == 0
+
+
+def test_manifest_detects_changed_params(folders):
+    assert len(_run(*folders)) == 1
+    assert len(_run(*folders, params={**PARAMS, "width": "25%"})) == 1
+
+
+def test_manifest_detects_missing_output(folders):
+    _, output_folder = folders
+    assert len(_run(*folders)) == 1
+    os.remove(os.path.join(output_folder, "img.webp"))
+    assert len(_run(*folders)) == 1
+
+
+def test_manifest_hash_ignores_touched_files(folders):
+    input_folder, _ = folders
+    assert len(_run(*folders, use_hash=True)) == 1
+    os.utime(os.path.join(input_folder, "img.png"), ns=(0, 0))
+    assert len(_run(*folders, use_hash=True)) == 0
+
+    # Without hashes a touched file is always reprocessed
+    os.utime(os.path.join(input_folder, "img.png"), ns=(1, 1))
+    assert len(_run(*folders, use_hash=False)) == 1
+
+
+def test_manifest_outputs_relative_to_output_folder(folders, monkeypatch):
+    input_folder, output_folder = folders
+    monkeypatch.chdir(BASE_FOLDER)
+    relative = [os.path.basename(input_folder), os.path.basename(output_folder)]
+    assert len(_run(*relative)) == 1
+
+    # The same folders, from another working directory
+    monkeypatch.chdir(tempfile.gettempdir())
+    assert len(_run(*folders)) == 0
+
+
+def test_manifest_skips_deleted_files(folders):
+    input_folder, output_folder = folders
+    manifest = Manifest(output_folder, input_folder, PARAMS)
+    files = [os.path.join(input_folder, name) for name in ["gone.png", "img.png"]]
+
+    assert list(manifest.changed(files)) == files[1:]
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from uuid import uuid4
+
+import pytest
+from PIL import Image
+
+from cli import CLI
+from image import ImageFormat, OutputSpec
+from pipeline import Pipeline
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+OUTPUT_BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_pipeline_test")
+
+
+def setup_module(module):
+    # Create Output Base Folder if not exists
+    if not os.path.exists(OUTPUT_BASE_FOLDER):
+        os.makedirs(OUTPUT_BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Output Base Folder if exists
+    if os.path.exists(OUTPUT_BASE_FOLDER):
+        shutil.rmtree(OUTPUT_BASE_FOLDER)
+
+
+@pytest.fixture(autouse=True)
+def no_cli(monkeypatch):
+    # The library API must never build a CLI or parse arguments
+    def fail(*args, **kwargs):
+        raise AssertionError("CLI should not be used")
+
+    monkeypatch.setattr(CLI, "__init__", fail)
+
+
+def test_pipeline_process_bytes():
+    # Arrange
+    pipeline = Pipeline(width="50%", format=ImageFormat.JPEG, mode="RGB")
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+
+    # Act
+    result = pipeline.process(data)
+
+    # Assert
+    image = Image.open(BytesIO(result))
+    assert image.format == "JPEG"
+    assert image.size == (220, 289)
+
+
+def test_pipeline_process_path_to_path():
+    # Arrange
+    pipeline = Pipeline(max_size=100, format="png", mode="L")
+    dest_path = os.path.join(OUTPUT_BASE_FOLDER, f"{uuid4()}.png")
+
+    # Act
+    result = pipeline.process(SOURCE_IMAGE, dest_path)
+
+    # Assert
+    image = Image.open(dest_path)
+    assert result == dest_path
+    assert image.mode == "L"
+    assert image.size == (76, 100)
+
+
+def test_pipeline_process_file_object():
+    # Arrange
+    pipeline = Pipeline(height=50)
+    dest = BytesIO()
+
+    # Act
+    with open(SOURCE_IMAGE, "rb") as f:
+        pipeline.process(f, dest)
+
+    # Assert
+    dest.seek(0)
+    assert Image.open(dest).size == (38, 50)
+
+
+def test_pipeline_process_all():
+    # Arrange
+    pipeline = Pipeline(
+        outputs=[
+            OutputSpec("thumb", max_size=50, format="PNG"),
+            OutputSpec("medium", width=200, format="WEBP"),
+        ]
+    )
+
+    # Act
+    results = pipeline.process_all(SOURCE_IMAGE)
+
+    # Assert
+    assert Image.open(BytesIO(results["thumb"])).size == (38, 50)
+    assert Image.open(BytesIO(results["medium"])).format == "WEBP"
+    with pytest.raises(ValueError):
+        pipeline.process(SOURCE_IMAGE)
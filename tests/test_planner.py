@@ -0,0 +1,51 @@
+from planner import plan_operations
+
+
+def test_plan_converts_before_resize():
+    # Arrange
+    operations = [
+        ("resize", ((100, 80), 0)),
+        ("convert", ("RGB",)),
+        ("convert", ("L",)),
+    ]
+
+    # Act
+    plan = plan_operations(operations, size=(400, 320), mode="RGB")
+
+    # Assert
+    assert plan == [("convert", ("L",)), ("resize", ((100, 80), 0))]
+
+
+def test_plan_keeps_alpha_for_resize():
+    # Arrange
+    operations = [("resize", ((100, 80), 2.0)), ("convert", ("L",))]
+
+    # Act
+    plan = plan_operations(operations, size=(400, 320), mode="RGBA")
+
+    # Assert
+    assert plan == operations
+
+
+def test_plan_merges_operations():
+    # Arrange
+    operations = [
+        ("rotate", (180,)),
+        ("resize", ((200, 160), 2.0)),
+        ("resize", ((100, 80), 0)),
+        ("convert", ("L",)),
+        ("convert", ("RGB",)),
+        ("rotate", (180,)),
+        ("rotate", (90,)),
+    ]
+
+    # Act
+    plan = plan_operations(operations, size=(400, 320), mode="RGBA")
+
+    # Assert
+    assert plan == [
+        ("resize", ((100, 80), 2.0)),
+        ("convert", ("L",)),
+        ("rotate", (90,)),
+        ("convert", ("RGB",)),
+    ]
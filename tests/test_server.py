@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+import server
+from server import ResizeServer
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+
+
+async def _request(port: int, method: str, target: str, body: bytes = b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload
+
+
+def _run_with_server(requests, **kwargs):
+    async def run():
+        server = ResizeServer(port=0, executor=ThreadPoolExecutor(2), **kwargs)
+        await server.start()
+        try:
+            return [await _request(server.port, *request) for request in requests]
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_server_resize():
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+
+    (status, payload), (health, _) = _run_with_server(
+        [("POST", "/resize?width=50%25&format=JPEG&mode=RGB", data), ("GET", "/health")]
+    )
+
+    assert status == 200
+    assert health == 200
+    image = Image.open(BytesIO(payload))
+    assert image.format == "JPEG"
+    assert image.size == (220, 289)
+
+
+def test_server_errors():
+    responses = _run_with_server(
+        [
+            ("POST", "/resize?width=abc", b"data"),
+            ("POST", "/resize?size=100", b"data"),
+            ("POST", "/resize?width=100", b"not an image"),
+            ("GET", "/resize?width=100"),
+            ("GET", "/unknown"),
+        ]
+    )
+
+    assert [status for status, _ in responses] == [400, 400, 422, 405, 404]
+
+
+def test_server_backpressure():
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+
+    ((status, payload),) = _run_with_server(
+        [("POST", "/resize?width=100", data)], max_pending=0
+    )
+
+    assert status == 503
+
+
+def test_server_timeout_keeps_slot(monkeypatch):
+    # A job that outlives its request still holds its slot until it is done
+    done = threading.Event()
+    monkeypatch.setattr(server, "render", lambda *args: done.wait(5) and b"")
+
+    try:
+        responses = _run_with_server(
+            [("POST", "/resize?width=100", b"data")] * 2, max_pending=1, timeout=0.1
+        )
+    finally:
+        done.set()
+
+    assert [status for status, _ in responses] == [504, 503]
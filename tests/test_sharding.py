@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+from cli import CLI
+from journal import merge_journals
+from main import process_folder
+from sharding import Shard, merge_shard_files
+from stats import FileStats, Stats, merge_summaries
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_sharding_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+def test_shard_parse():
+    # Act & Assert
+    assert str(Shard.parse("2/4")) == "2/4"
+    assert Shard.parse("2/4").file_name(".rexize-journal") == ".rexize-journal.2-of-4"
+    for value in ["0/4", "5/4", "1/0", "1-4", "a/b"]:
+        with pytest.raises(ValueError):
+            Shard.parse(value)
+
+
+def test_shard_select():
+    # Arrange
+    files = [f"/data/in/dir{i % 7}/img{i}.png" for i in range(1000)]
+    shards = [Shard(index, 4) for index in range(1, 5)]
+
+    # Act
+    selected = [list(shard.select(files, "/data/in")) for shard in shards]
+
+    # Assert: disjoint, complete, balanced and independent of the folder root
+    assert sorted(sum(selected, [])) == sorted(files)
+    assert all(200 < len(files) < 300 for files in selected)
+    moved = [file.replace("/data/in", "/mnt/in") for file in files]
+    assert list(shards[0].select(moved, "/mnt/in")) == [
+        file.replace("/data/in", "/mnt/in") for file in selected[0]
+    ]
+
+
+def test_sharded_run_and_merge():
+    # Arrange
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    output_folder = f"{input_folder}_out"
+    os.makedirs(input_folder)
+    for i in range(6):
+        shutil.copy(SOURCE_IMAGE, os.path.join(input_folder, f"img{i}.png"))
+    args = [input_folder, output_folder, "-W", "10%", "-j", "1", "--incremental"]
+
+    # Act
+    counts = [
+        process_folder(CLI(args + ["--shard", f"{i}/3", "-q"])).file_count
+        for i in (1, 2, 3)
+    ]
+    status = merge_shard_files(output_folder, remove=True)
+    rerun = process_folder(CLI(args + ["--resume", "-q"]))
+
+    # Assert
+    assert sum(counts) == 6
+    assert status == 0
+    assert sorted(os.listdir(output_folder))[:2] == [
+        ".rexize-journal",
+        ".rexize-manifest.json",
+    ]
+    assert rerun.file_count == 0
+    assert rerun.journal.skipped == 6
+
+
+def test_merge_journals_into_existing():
+    # Arrange: a journal in progress, and the journals of two shards
+    folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(folder)
+    dest = os.path.join(folder, ".rexize-journal")
+    header = "# rexize journal v1 abc\n"
+    journals = {dest: "a.png\nb.png\n", f"{dest}.1-of-2": "b.png\nc.png\n"}
+    journals[f"{dest}.2-of-2"] = "d.png\n"
+    for path, lines in journals.items():
+        with open(path, "w") as f:
+            f.write(header + lines)
+    other = os.path.join(folder, "other")
+    with open(other, "w") as f:
+        f.write("# rexize journal v1 def\ne.png\n")
+
+    # Act
+    merge_journals([f"{dest}.1-of-2", f"{dest}.2-of-2"], dest)
+    with pytest.raises(ValueError):
+        merge_journals([other], dest)
+
+    # Assert: the merged journal is kept as it was by the refused merge
+    with open(dest) as f:
+        assert f.read() == header + "a.png\nb.png\nc.png\nd.png\n"
+
+
+def test_merge_summaries():
+    # Arrange
+    summaries = []
+    for seconds in [1.0, 3.0]:
+        stats = Stats(slowest=1)
+        file_stats = FileStats(f"{seconds}.png")
+        file_stats.timings["resize"] = seconds
+        stats.add(file_stats)
+        summaries.append(stats.summary())
+
+    # Act
+    summary = merge_summaries(summaries)
+
+    # Assert
+    assert summary["files"] == 2
+    assert summary["stages"]["resize"]["total"] == 4.0
+    assert summary["stages"]["resize"]["mean"] == 2.0
+    assert summary["stages"]["resize"]["max"] == 3.0
+    assert [item["file"] for item in summary["slowest"]] == ["3.0.png"]
+
+
+def test_merge_summaries_small_shards():
+    # Arrange: shards with fewer files than the slowest files to report
+    summaries = []
+    for shard in range(2):
+        stats = Stats(slowest=10)
+        for i in range(2):
+            file_stats = FileStats(f"{shard}-{i}.png")
+            file_stats.timings["resize"] = shard + i / 10
+            stats.add(file_stats)
+        summaries.append(stats.summary())
+
+    # Act
+    summary = merge_summaries(summaries)
+
+    # Assert
+    assert len(summary["slowest"]) == 4
+    assert summary["slowest"][0]["file"] == "1-1.png"
+    assert summary["slowest_count"] == 10
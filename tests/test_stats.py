@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+from image_manipulator import ImageManipulator
+from stats import FileStats, Stats
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"
+OUTPUT_BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_stats_test")
+
+
+def setup_module(module):
+    # Create Output Base Folder if not exists
+    if not os.path.exists(OUTPUT_BASE_FOLDER):
+        os.makedirs(OUTPUT_BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Output Base Folder if exists
+    if os.path.exists(OUTPUT_BASE_FOLDER):
+        shutil.rmtree(OUTPUT_BASE_FOLDER)
+
+
+def test_file_stats_from_image_manipulator():
+    # Arrange
+    file_stats = FileStats(SOURCE_IMAGE)
+    dest_path = os.path.join(OUTPUT_BASE_FOLDER, f"{uuid4()}.png")
+
+    # Act
+    ImageManipulator(SOURCE_IMAGE, stats=file_stats).resize(
+        100, 0
+    ).downscale_to_grayscale().save(dest_path)
+
+    # Assert
+    assert set(file_stats.timings) == {"open", "decode", "resize", "convert", "save"}
+    assert file_stats.bytes_in == os.path.getsize(SOURCE_IMAGE)
+    assert file_stats.bytes_out == os.path.getsize(dest_path)
+
+
+def test_stats_summary():
+    # Arrange
+    stats = Stats(slowest=2)
+    for i in range(1, 11):
+        file_stats = FileStats(f"file{i}")
+        file_stats.timings = {"decode": i / 100, "resize": i / 10}
+        file_stats.bytes_in = 10
+        stats.add(file_stats)
+    files = list(stats.timed(["a", "b"]))
+
+    # Act
+    summary = stats.summary()
+
+    # Assert
+    assert files == ["a", "b"]
+    assert summary["files"] == 10
+    assert summary["bytes_in"] == 100
+    assert list(summary["stages"]) == ["walk", "decode", "resize"]
+    assert summary["stages"]["resize"]["p50"] == 0.5
+    assert summary["stages"]["resize"]["p90"] == 0.9
+    assert summary["stages"]["resize"]["max"] == 1.0
+    assert [item["file"] for item in summary["slowest"]] == ["file10", "file9"]
+    assert "Slowest files:" in stats.report()
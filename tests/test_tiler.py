@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from uuid import uuid4
+
+from PIL import Image
+
+from cli import CLI
+from image import ImageFormat
+from main import Batch, process_serial
+from tiler import TilePyramid
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_tiler_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+def test_tile_pyramid():
+    # Arrange
+    dest = os.path.join(BASE_FOLDER, str(uuid4()), "scan")
+    os.makedirs(os.path.dirname(dest))
+    pyramid = TilePyramid(tile_size=256, overlap=1, format=ImageFormat.PNG)
+
+    # Act
+    descriptor = pyramid.write(Image.open(SOURCE_IMAGE), dest)
+
+    # Assert: levels down to 1x1, each halved from the one above
+    assert descriptor == f"{dest}.dzi"
+    with open(descriptor) as f:
+        assert f.read() == pyramid.descriptor((440, 578))
+    assert sorted(map(int, os.listdir(f"{dest}_files"))) == list(range(11))
+    assert Image.open(f"{dest}_files/10/0_0.png").size == (257, 257)
+    assert Image.open(f"{dest}_files/10/1_2.png").size == (185, 67)
+    assert Image.open(f"{dest}_files/9/0_0.png").size == (220, 257)
+    assert Image.open(f"{dest}_files/0/0_0.png").size == (1, 1)
+    assert pyramid.tiles == 6 + 2 + 9
+
+
+def test_tile_pyramid_skip_uniform():
+    # Arrange: a white page with the test image in its top left corner
+    dest = os.path.join(BASE_FOLDER, str(uuid4()), "page")
+    os.makedirs(os.path.dirname(dest))
+    page = Image.new("RGB", (1024, 1024), "white")
+    page.paste(Image.open(SOURCE_IMAGE).convert("RGB"), (0, 0))
+    pyramid = TilePyramid(tile_size=256, format=ImageFormat.JPEG, skip_uniform=True)
+
+    # Act
+    pyramid.write(page, dest)
+
+    # Assert: the levels that fit in one tile are kept whole
+    tiles = sorted(os.listdir(f"{dest}_files/10"))
+    assert tiles == ["0_0.jpg", "0_1.jpg", "0_2.jpg", "1_0.jpg", "1_1.jpg", "1_2.jpg"]
+    assert sorted(os.listdir(f"{dest}_files/9")) == ["0_0.jpg", "0_1.jpg"]
+    assert os.listdir(f"{dest}_files/0") == ["0_0.jpg"]
+    assert pyramid.skipped == 10 + 2
+
+
+def test_tile_pyramid_palette():
+    # Arrange: a GIF-like palette image with a transparent colour
+    dest = os.path.join(BASE_FOLDER, str(uuid4()), "logo")
+    os.makedirs(os.path.dirname(dest))
+    image = Image.open(SOURCE_IMAGE).convert("RGB").quantize(16)
+    image.info["transparency"] = 0
+    pyramid = TilePyramid(tile_size=256, format=ImageFormat.PNG)
+
+    # Act
+    pyramid.write(image, dest)
+
+    # Assert
+    assert pyramid.tiles == 6 + 2 + 9
+    assert Image.open(f"{dest}_files/10/0_0.png").mode == "RGBA"
+
+
+def test_tile_files():
+    # Arrange
+    input_folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    output_folder = f"{input_folder}_out"
+    os.makedirs(os.path.join(input_folder, "sub"))
+    file = os.path.join(input_folder, "sub", "img.png")
+    shutil.copy(SOURCE_IMAGE, file)
+    cli = CLI([input_folder, output_folder, "-W", "50%", "--tiles", "-q"])
+
+    # Act
+    batch = process_serial([file], Batch(cli))
+    batch.close()
+
+    # Assert
+    descriptor = os.path.join(output_folder, "sub", "img.dzi")
+    assert batch.file_count == 1
+    with open(descriptor) as f:
+        assert 'Width="220" Height="289"' in f.read()
+    assert os.path.exists(
+        os.path.join(output_folder, "sub", "img_files", "9", "0_0.webp")
+    )
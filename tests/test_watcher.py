@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+import pytest
+
+from file_iterator import FileIterator
+from watcher import Watcher
+
+# Constants
+SOURCE_IMAGE = "tests/data/test_img.png"  # PNG Image W 440 x H 578
+BASE_FOLDER = os.path.join(tempfile.gettempdir(), "resize_imgs_watcher_test")
+
+
+def setup_module(module):
+    # Create Base Folder if not exists
+    if not os.path.exists(BASE_FOLDER):
+        os.makedirs(BASE_FOLDER)
+
+
+def teardown_module(module):
+    # Delete Base Folder if exists
+    if os.path.exists(BASE_FOLDER):
+        shutil.rmtree(BASE_FOLDER)
+
+
+@pytest.mark.parametrize("poll_interval", [0, 0.05])
+def test_watcher(poll_interval):
+    # Arrange
+    folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(folder)
+    shutil.copy(SOURCE_IMAGE, os.path.join(folder, "old.png"))
+    files = FileIterator(folder).filter_by_extension(["png"])
+    watcher = Watcher(files, debounce=0.05, poll_interval=poll_interval)
+    changes = watcher.changes()
+
+    # Act: a new file in a new folder, a file to ignore, then a deletion
+    os.makedirs(os.path.join(folder, "sub"))
+    shutil.copy(SOURCE_IMAGE, os.path.join(folder, "sub", "new.png"))
+    shutil.copy(SOURCE_IMAGE, os.path.join(folder, "sub", "new.txt"))
+    added = next(changes)
+    os.remove(os.path.join(folder, "old.png"))
+    removed = next(changes)
+    watcher.close()
+
+    # Assert
+    assert watcher.polling == bool(poll_interval)
+    assert added == ([os.path.join(folder, "sub", "new.png")], [])
+    assert removed == ([], [os.path.join(folder, "old.png")])
+
+
+def test_watcher_slow_writer():
+    # Arrange: a writer pausing for longer than the debounce between chunks
+    folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(folder)
+    with open(SOURCE_IMAGE, "rb") as f:
+        data = f.read()
+    file = os.path.join(folder, "slow.png")
+    watcher = Watcher(FileIterator(folder), debounce=0.05)
+
+    def write():
+        with open(file, "wb") as f:
+            for start in range(0, len(data), len(data) // 4 + 1):
+                f.write(data[start : start + len(data) // 4 + 1])
+                f.flush()
+                time.sleep(0.15)
+
+    # Act
+    writer = threading.Thread(target=write)
+    writer.start()
+    changed, _ = next(watcher.changes())
+    size = os.path.getsize(file)
+    writer.join()
+    watcher.close()
+
+    # Assert: only reported once complete
+    assert changed == [file]
+    assert size == len(data)
+
+
+def test_file_iterator_matches():
+    # Arrange
+    folder = os.path.join(BASE_FOLDER, str(uuid4()))
+    os.makedirs(folder)
+    files = FileIterator(folder).filter_by_extension(["png"]).exclude(["tmp"])
+
+    # Act & Assert
+    assert files.matches(os.path.join(folder, "a", "b.png"))
+    assert not files.matches(os.path.join(folder, "a", "b.txt"))
+    assert not files.matches(os.path.join(folder, "tmp", "b.png"))
+    assert not files.matches(os.path.join(BASE_FOLDER, "b.png"))
+    assert not files.max_depth(0).matches(os.path.join(folder, "a", "b.png"))